@@ -2,11 +2,17 @@ import frappe
 import requests
 from werkzeug.wrappers import Response
 from datetime import datetime, timedelta
-from frappe.utils import now_datetime, cstr
-from .helpers import get_settings, get_access_token
-from werkzeug.exceptions import HTTPException
+from frappe.utils import now_datetime, get_datetime, cint, cstr
+from .helpers import (
+    get_settings, get_access_token, clear_access_token_cache, cache_access_token, acquire_cache_lock,
+    acquire_cache_locks, release_cache_lock, request_with_retry_after, retry_after_seconds, SESSION,
+    AUTH_STATUS_CACHE_KEY, TOKEN_EXPIRY_CACHE_KEY, GRAPH_BATCH_LIMIT
+)
 import json
 import hashlib
+import hmac
+import time
+import orjson
 
 @frappe.whitelist(allow_guest=True)
 def callback(code=None, state=None, error=None, error_description=None):
@@ -42,14 +48,19 @@ def callback(code=None, state=None, error=None, error_description=None):
         }
         
         # Exchange code for tokens
-        response = requests.post(token_url, headers=headers, data=data, timeout=30)
+        response = SESSION.post(token_url, headers=headers, data=data, timeout=30)
         
         if response.status_code != 200:
-            error_data = response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
-            frappe.log_error(f"Token exchange failed: {response.status_code} - {error_data}", "Teams Token Exchange Error")
+            # Only decode JSON error bodies; HTML error pages are truncated to keep the Error Log small
+            content_type = response.headers.get("content-type", "")
+            error_data = orjson.loads(response.content) if "application/json" in content_type else response.text[:500]
+            frappe.log_error(
+                message=f"Token exchange failed: {response.status_code} - {json.dumps(error_data)[:1000]}",
+                title="Teams Token Exchange Error"
+            )
             frappe.throw(f"Failed to authenticate with Microsoft Teams. Please try again.")
         
-        token_data = response.json()
+        token_data = orjson.loads(response.content)
         
         # Update settings with new tokens
         settings.access_token = token_data.get("access_token")
@@ -59,42 +70,24 @@ def callback(code=None, state=None, error=None, error_description=None):
         expires_in = token_data.get("expires_in", 3600)
         settings.token_expiry = now_datetime() + timedelta(seconds=expires_in - 300)
         
-        settings.save(ignore_permissions=True)
+        # Write only the token fields instead of a full Teams Settings save
+        frappe.db.set_value("Teams Settings", "Teams Settings", {
+            "access_token": settings.access_token,
+            "refresh_token": settings.refresh_token,
+            "token_expiry": settings.token_expiry
+        })
         frappe.db.commit()
-        
-        # Get user info and save Azure ID
-        try:
-            user_info_response = requests.get(
-                "https://graph.microsoft.com/v1.0/me",
-                headers={"Authorization": f"Bearer {settings.access_token}"},
-                timeout=30
-            )
-            
-            if user_info_response.status_code == 200:
-                user_info = user_info_response.json()
-                azure_id = user_info.get("id")
-                user_email = user_info.get("mail") or user_info.get("userPrincipalName")
-                
-                if azure_id:
-                    # Update current user's Azure ID
-                    if frappe.session.user != "Guest":
-                        frappe.db.set_value("User", frappe.session.user, "azure_object_id", azure_id)
-                    
-                    # Also update based on email if available
-                    if user_email and frappe.db.exists("User", {"email": user_email}):
-                        frappe.db.set_value("User", {"email": user_email}, "azure_object_id", azure_id)
-                    
-                    # Update settings with owner info if not set
-                    if not settings.azure_owner_email_id and user_email:
-                        settings.azure_owner_email_id = user_email
-                        settings.owner_azure_object_id = azure_id
-                        settings.save(ignore_permissions=True)
-                    
-                    frappe.db.commit()
-                    
-        except Exception as e:
-            # Log but don't fail the authentication process
-            frappe.log_error(f"Failed to fetch user info: {str(e)}", "Teams User Info Error")
+        frappe.clear_cache(doctype="Teams Settings")
+        # Replace any stale cached state and prime the new token for the jobs enqueued below
+        clear_access_token_cache()
+        cache_access_token(settings.access_token, settings.token_expiry)
+
+        # Fetch user info and save Azure ID in the background so the redirect isn't blocked
+        frappe.enqueue(
+            "erpnext_teams_integration.api.auth._sync_azure_profile",
+            user=frappe.session.user,
+            queue="short"
+        )
         
         # Successful authentication redirect
         redirect_url = "/app/teams-settings?teams_authentication_status=success"
@@ -115,22 +108,99 @@ def callback(code=None, state=None, error=None, error_description=None):
         frappe.local.response["location"] = "/app/teams-settings?teams_authentication_status=error"
 
 
+def _sync_azure_profile(user):
+    """Background job: store the authenticated Microsoft user's Azure ID on the ERPNext User and Teams Settings"""
+    try:
+        access_token = get_access_token()
+        if not access_token:
+            return
+
+        user_info_response = SESSION.get(
+            "https://graph.microsoft.com/v1.0/me",
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=30
+        )
+
+        if user_info_response.status_code != 200:
+            return
+
+        user_info = orjson.loads(user_info_response.content)
+        azure_id = user_info.get("id")
+        user_email = user_info.get("mail") or user_info.get("userPrincipalName")
+
+        if not azure_id:
+            return
+
+        # Update the current user's Azure ID and, if available, the User matching the Microsoft email,
+        # in one statement that leaves rows already holding this ID untouched
+        conditions, values = [], []
+        if user and user != "Guest":
+            conditions.append("name=%s")
+            values.append(user)
+        if user_email:
+            conditions.append("email=%s")
+            values.append(user_email)
+
+        if conditions:
+            frappe.db.sql(
+                f"""UPDATE `tabUser` SET azure_object_id=%s
+                WHERE ({" OR ".join(conditions)}) AND COALESCE(azure_object_id, '') != %s""",
+                (azure_id, *values, azure_id)
+            )
+
+        # Update settings with owner info if not set, without a second full Teams Settings save
+        if user_email and not frappe.db.get_single_value("Teams Settings", "azure_owner_email_id"):
+            frappe.db.set_value("Teams Settings", "Teams Settings", {
+                "azure_owner_email_id": user_email,
+                "owner_azure_object_id": azure_id
+            })
+
+    except Exception as e:
+        frappe.log_error(f"Failed to fetch user info: {str(e)}", "Teams User Info Error")
+
+
 @frappe.whitelist()
 def get_authentication_status():
     """Check if Teams integration is properly authenticated"""
+    # The UI polls this; reuse a recent positive result instead of re-checking every time
+    cached_status = frappe.cache().get_value(AUTH_STATUS_CACHE_KEY)
+    if cached_status:
+        return cached_status
+
+    status = _check_authentication_status()
+    if status.get("authenticated"):
+        frappe.cache().set_value(AUTH_STATUS_CACHE_KEY, status, expires_in_sec=60)
+    else:
+        frappe.cache().delete_value(AUTH_STATUS_CACHE_KEY)
+
+    return status
+
+
+def _check_authentication_status():
     try:
+        # Cached epoch expiry answers the common case without loading Teams Settings
+        expiry_ts = frappe.cache().get_value(TOKEN_EXPIRY_CACHE_KEY)
+        if expiry_ts and expiry_ts > time.time() + 120:
+            return {"authenticated": True, "message": "Authentication successful"}
+
         settings = get_settings()
         
         if not settings.access_token:
             return {"authenticated": False, "message": "No access token found"}
         
-        # Check if token is expired
-        if settings.token_expiry and settings.token_expiry < now_datetime():
+        # Check if token is expired; silently refresh it before asking the user to re-authenticate
+        if settings.token_expiry and get_datetime(settings.token_expiry) < now_datetime():
+            if settings.refresh_token and get_access_token():
+                return {"authenticated": True, "message": "Authentication successful"}
             return {"authenticated": False, "message": "Token expired"}
         
-        # Test the token by making a simple API call
+        # Trust the stored expiry while it is comfortably in the future
+        if settings.token_expiry and get_datetime(settings.token_expiry) > now_datetime() + timedelta(minutes=2):
+            return {"authenticated": True, "message": "Authentication successful"}
+
+        # Expiry unknown or imminent: test the token by making a simple API call
         headers = {"Authorization": f"Bearer {settings.access_token}"}
-        response = requests.get("https://graph.microsoft.com/v1.0/me", headers=headers, timeout=10)
+        response = SESSION.get("https://graph.microsoft.com/v1.0/me", headers=headers, timeout=10)
         
         if response.status_code == 200:
             return {"authenticated": True, "message": "Authentication successful"}
@@ -146,14 +216,15 @@ def get_authentication_status():
 def revoke_authentication():
     """Revoke Teams authentication and clear tokens"""
     try:
-        settings = get_settings()
-        
         # Clear all authentication related fields
-        settings.access_token = ""
-        settings.refresh_token = ""
-        settings.token_expiry = None
-        settings.save(ignore_permissions=True)
+        frappe.db.set_value("Teams Settings", "Teams Settings", {
+            "access_token": "",
+            "refresh_token": "",
+            "token_expiry": None
+        })
         frappe.db.commit()
+        frappe.clear_cache(doctype="Teams Settings")
+        clear_access_token_cache()
         
         return {"success": True, "message": "Authentication revoked successfully"}
         
@@ -163,16 +234,41 @@ def revoke_authentication():
 
 #Webhook and Subscription Management
 GRAPH_API = "https://graph.microsoft.com/v1.0"
+WEBHOOK_DEDUPE_SECONDS = 30
+UNTRACKED_RESOURCE_SECONDS = 3600
+RSVP_TIMEOUT_RETRIES = 3
+RSVP_RETRY_BACKOFF_SECONDS = 5  # Doubled on every retry; picked up by the next per-minute scheduler run
+RSVP_LOCK_RETRY_SECONDS = 10  # teams_rsvp_lock lifetime; a busy event is refetched after it
+RSVP_RETRY_QUEUE_KEY = "teams_rsvp_retry"  # Sorted set of [resource_url, attempt] scored by due time
+WEBHOOK_RATE_LIMIT = 500  # Authenticated notifications accepted per window, site-wide
+WEBHOOK_RATE_WINDOW_SECONDS = 10
+# Renewed at most every other day: 70.5h lifetime, renewed once under 36h is left, so
+# a run that skips still leaves the next daily run over 12h of margin
+SUBSCRIPTION_LIFETIME = timedelta(minutes=4230)
+SUBSCRIPTION_RENEW_BEFORE = timedelta(hours=36)
+GRAPH_CLIENT_STATE = "FrappeTeamsSyncV1"  # Echoed back by Graph on every notification
+
+# Graph attendee response -> Event Participants "attending" value
+RSVP_STATUS_MAP = {
+    "accepted": "Yes",
+    "declined": "No",
+    "tentative": "Maybe"
+}
 
-class GraphValidationResponse(HTTPException):
-    def __init__(self, token):
-        super().__init__()
-        self.response = Response(token, status=200, mimetype='text/plain')
+def _graph_ack(body="Accepted", status=202, headers=None):
+    """Plain-text werkzeug response; Frappe passes it straight through without building its JSON envelope"""
+    return Response(body, status=status, headers=headers, mimetype='text/plain')
 
-class GraphAcceptedResponse(HTTPException):
-    def __init__(self):
-        super().__init__()
-        self.response = Response("Accepted", status=202, mimetype='text/plain')
+def _webhook_over_rate_limit(count):
+    """Count notifications against a fixed site-wide window; True once the window's limit is exceeded.
+    Graph posts from a shared pool of addresses, so the source IP is not a useful key."""
+    window = int(time.time()) // WEBHOOK_RATE_WINDOW_SECONDS
+    cache = frappe.cache()
+    key = cache.make_key(f"teams_wh_rate:{window}")
+    total = cache.incrby(key, count)
+    if total == count:
+        cache.expire(key, WEBHOOK_RATE_WINDOW_SECONDS + 5)
+    return total > WEBHOOK_RATE_LIMIT
 
 # ---------------------------------------------------------------------------
 # 🎧 THE WEBHOOK LISTENER
@@ -183,13 +279,16 @@ def handle_graph_webhook(**kwargs):
     The main listener for Microsoft Graph API Subscriptions.
     Must be a public endpoint (allow_guest=True) and accept **kwargs.
     """
-    _ = frappe.request.get_data()
-
     # Grab token safely from the URL query parameters
     token = frappe.request.args.get('validationToken') or frappe.form_dict.get('validationToken')
     
     if token:
-        raise GraphValidationResponse(token)
+        return _graph_ack(token, status=200)
+
+    # Empty pings have nothing to parse. Chunked deliveries have no Content-Length (None),
+    # so only an explicit zero counts as empty.
+    if frappe.request.content_length == 0:
+        return _graph_ack()
 
     # --- Handling the Actual RSVPs Below ---
     try:
@@ -199,19 +298,46 @@ def handle_graph_webhook(**kwargs):
         payload = frappe.request.get_json()
         
         if payload and "value" in payload:
-            for notification in payload.get("value", []):
-                resource_url = notification.get("resource")
-                if resource_url:
-                    frappe.enqueue(
-                        "erpnext_teams_integration.api.auth.process_rsvp_change",
-                        resource_url=resource_url,
-                        queue="short"
-                    )
+            # Notifications without our clientState are dropped silently (still 202) so spoofed
+            # posts can't fill the queue, use up the rate limit or learn that they were rejected.
+            # Compared as bytes: compare_digest raises TypeError on non-ASCII str.
+            resources = [
+                notification["resource"]
+                for notification in payload.get("value") or []
+                if notification.get("resource")
+                and hmac.compare_digest(
+                    cstr(notification.get("clientState")).encode(), GRAPH_CLIENT_STATE.encode()
+                )
+            ]
+
+            # Graph drops a notification for good once it gets a 2xx, so bursts over the limit
+            # are answered with 429 + Retry-After, which Graph backs off from and redelivers
+            if resources and _webhook_over_rate_limit(len(resources)):
+                return _graph_ack(
+                    "Too Many Requests",
+                    status=429,
+                    headers={"Retry-After": str(WEBHOOK_RATE_WINDOW_SECONDS)}
+                )
+
+            # Graph also delivers the same change several times; copies are coalesced while a
+            # job is still pending. Every resource is claimed in one pipelined round-trip.
+            claimed = acquire_cache_locks(
+                [_webhook_dedupe_key(resource) for resource in resources], WEBHOOK_DEDUPE_SECONDS
+            ) if resources else []
+            resource_urls = [resource for resource, ok in zip(resources, claimed, strict=True) if ok]
+
+            # One job per delivery keeps the 202 acknowledgement fast
+            if resource_urls:
+                frappe.enqueue(
+                    "erpnext_teams_integration.api.auth.process_rsvp_batch",
+                    resource_urls=resource_urls,
+                    queue="short"
+                )
     except Exception as e:
         frappe.log_error(message=str(e), title="Webhook Payload Error")
 
-    # Acknowledge the RSVP to Microsoft using the exact same hijack trick
-    raise GraphAcceptedResponse()
+    # Acknowledge the RSVP to Microsoft
+    return _graph_ack()
 
 
 # ---------------------------------------------------------------------------
@@ -224,20 +350,26 @@ def subscribe_to_calendar_events():
     if not token:
         frappe.throw("Authentication required.")
 
+    return _create_calendar_subscription(token)
+
+
+def _create_calendar_subscription(token):
+    """Creates the /me/events subscription with an already-loaded access token."""
     # REMINDER: Hardcoded for Ngrok testing. 
     # Move this to frappe.db.get_single_value('Teams Settings', 'webhook_base_url') for production.
     # ngrok_base = "https://ae39-115-241-89-123.ngrok-free.app"
     notification_url = frappe.utils.get_url("/api/method/erpnext_teams_integration.api.auth.handle_graph_webhook")
 
-    # Calendar subscriptions expire in maximum 4230 minutes. We use 2 days.
-    expiration_time = datetime.utcnow() + timedelta(days=2)
+    # Calendar subscriptions expire in maximum 4230 minutes; take all of it
+    expiration_time = datetime.utcnow() + SUBSCRIPTION_LIFETIME
+    local_expiry = now_datetime() + SUBSCRIPTION_LIFETIME
 
     payload = {
         "changeType": "updated",
         "notificationUrl": notification_url,
         "resource": "/me/events", 
         "expirationDateTime": expiration_time.strftime("%Y-%m-%dT%H:%M:%SZ"),
-        "clientState": "FrappeTeamsSyncV1"
+        "clientState": GRAPH_CLIENT_STATE
     }
 
     headers = {
@@ -245,10 +377,20 @@ def subscribe_to_calendar_events():
         "Content-Type": "application/json"
     }
 
-    res = requests.post(f"{GRAPH_API}/subscriptions", headers=headers, json=payload)
+    res = request_with_retry_after(
+        "POST", f"{GRAPH_API}/subscriptions", headers=headers, data=orjson.dumps(payload), timeout=(3, 10)
+    )
 
     if res.status_code == 201:
-        data = res.json()
+        data = orjson.loads(res.content)
+
+        # Persist right away so a crash after the POST can't orphan the subscription
+        frappe.db.set_value("Teams Settings", "Teams Settings", {
+            "custom_webhook_subscription_id": data.get("id"),
+            "custom_webhook_subscription_expiry": local_expiry
+        })
+        frappe.db.commit()
+
         return {"success": True, "subscription_id": data.get("id")}
     else:
         # Safely named kwargs to avoid the 140-char title limit crash
@@ -256,72 +398,266 @@ def subscribe_to_calendar_events():
         frappe.throw(f"Failed to subscribe: {res.status_code}")
         
 
-def process_rsvp_change(resource_url):
+def process_rsvp_batch(resource_urls, attempt=0):
     """
     Background job triggered by Graph API Webhook.
-    Fetches the latest event details and updates the Frappe Event Participants table.
+    Fetches every resource in a notification batch through Graph JSON batching
+    and syncs the RSVPs into the Frappe Event Participants table.
+    """
+    token = get_access_token()
+    if not token:
+        return
+
+    headers = {
+        "Authorization": f"Bearer {token}", 
+        "Content-Type": "application/json"
+    }
+
+    # Drop repeated resources (order preserved) so each event is fetched once per job
+    resource_urls = list(dict.fromkeys(resource_urls))
+
+    # Re-open the webhook window before fetching: notifications arriving from now on
+    # may carry changes this fetch won't see, so they must be allowed to enqueue again
+    for resource_url in resource_urls:
+        release_cache_lock(_webhook_dedupe_key(resource_url))
+
+    resource_urls = _drop_untracked_resources(resource_urls)
+
+    for i in range(0, len(resource_urls), GRAPH_BATCH_LIMIT):
+        _sync_rsvp_chunk(resource_urls[i:i + GRAPH_BATCH_LIMIT], headers, attempt)
+
+
+def process_rsvp_change(resource_url):
     """
+    Background job for a single Graph resource.
+    Kept so jobs enqueued before batching was introduced still run.
+    """
+    process_rsvp_batch([resource_url])
+
+
+def _webhook_dedupe_key(resource_url):
+    return f"teams_wh:{hashlib.sha1(resource_url.encode()).hexdigest()}"
+
+
+def _untracked_resource_key(resource_url):
+    return f"teams_untracked_res:{hashlib.sha1(resource_url.encode()).hexdigest()}"
+
+
+def _drop_untracked_resources(resource_urls):
+    """Skip resources recently found not to belong to any ERPNext Event.
+    The marker holds the Outlook event ID, so one that has since been linked to an Event is fetched again."""
+    cache = frappe.cache()
+    untracked = {}
+    for url in resource_urls:
+        event_id = cache.get_value(_untracked_resource_key(url))
+        if event_id:
+            untracked[url] = event_id
+
+    if not untracked:
+        return resource_urls
+
+    linked = set(frappe.db.get_all(
+        "Event",
+        filters={"custom_outlook_event_id": ["in", list(set(untracked.values()))]},
+        pluck="custom_outlook_event_id"
+    ))
+    for url, event_id in untracked.items():
+        if event_id in linked:
+            cache.delete_value(_untracked_resource_key(url))
+
+    return [url for url in resource_urls if url not in untracked or untracked[url] in linked]
+
+
+def _to_batch_url(resource_url):
+    """Graph $batch sub-requests take URLs relative to the API version root."""
+    if resource_url.startswith(GRAPH_API):
+        resource_url = resource_url[len(GRAPH_API):]
+    return f"/{resource_url.lstrip('/')}"
+
+
+def _with_select(url, fields):
+    """Append an OData $select projection, respecting any existing query string."""
+    sep = "&" if "?" in url else "?"
+    return f"{url}{sep}$select={fields}"
+
+
+def _sync_rsvp_chunk(resource_urls, headers, attempt=0):
+    """Fetches up to GRAPH_BATCH_LIMIT events in one $batch call and applies their RSVPs."""
     try:
-        token = get_access_token()
-        if not token: 
-            return
-            
-        if not resource_url.startswith("https"):
-            url = f"{GRAPH_API}/{resource_url.lstrip('/')}"
-        else:
-            url = resource_url
-            
-        headers = {
-            "Authorization": f"Bearer {token}", 
-            "Content-Type": "application/json"
+        # Only id and attendees are used, so ask Graph for just those fields
+        batch_payload = {
+            "requests": [
+                {"id": str(i), "method": "GET", "url": _with_select(_to_batch_url(url), "id,attendees")}
+                for i, url in enumerate(resource_urls)
+            ]
         }
-            
-        res = requests.get(url, headers=headers, timeout=30)
         
-        if res.status_code != 200:
-            frappe.log_error(message=res.text, title="RSVP Sync Error")
+        # Short (connect, read) timeouts so a slow Graph doesn't pin the worker slot
+        res = SESSION.post(
+            f"{GRAPH_API}/$batch", headers=headers, data=orjson.dumps(batch_payload), timeout=(3, 10)
+        )
+        # The adapter never retries POST, so a throttled or failing $batch is parked for a
+        # later attempt, no sooner than Graph's Retry-After
+        if res.status_code == 429 or res.status_code >= 500:
+            if not _schedule_rsvp_retry(resource_urls, attempt, retry_after_seconds(res.headers, None)):
+                frappe.log_error(
+                    message=f"$batch returned {res.status_code}\n" + "\n".join(resource_urls),
+                    title="RSVP Sync Error"
+                )
             return
+        res.raise_for_status()
+
+        events = []
+        throttled = []
+        retry_after = None
+        for sub_response in orjson.loads(res.content).get("responses", []):
+            resource_url = resource_urls[int(sub_response.get("id", 0))]
+            status = cint(sub_response.get("status"))
+            if status == 429 or status >= 500:
+                # Graph throttles per sub-request inside a 200 $batch
+                throttled.append(resource_url)
+                sub_retry_after = retry_after_seconds(sub_response.get("headers"), None)
+                if sub_retry_after:
+                    retry_after = max(retry_after or 0, sub_retry_after)
+                continue
+            if status != 200:
+                frappe.log_error(
+                    message=f"{resource_url}: {sub_response.get('body')}",
+                    title="RSVP Sync Error"
+                )
+                continue
             
-        event_data = res.json()
-        outlook_event_id = event_data.get("id")
-        attendees = event_data.get("attendees", [])
+            event_data = sub_response.get("body") or {}
+            if event_data.get("id") and event_data.get("attendees"):
+                events.append((resource_url, event_data))
         
-        if not outlook_event_id or not attendees:
+        if throttled and not _schedule_rsvp_retry(throttled, attempt, retry_after):
+            frappe.log_error(message="\n".join(throttled), title="RSVP Sync Throttled")
+
+        if not events:
             return
-            
-        event_name = frappe.db.get_value("Event", {"custom_outlook_event_id": outlook_event_id}, "name")
-        if not event_name:
-            return 
-            
-        status_map = {
-            "accepted": "Yes",
-            "declined": "No",
-            "tentative": "Maybe" 
+
+        # Resolve every Outlook ID in the chunk to its ERPNext Event in one query
+        event_names = {
+            row.custom_outlook_event_id: row.name
+            for row in frappe.db.get_all(
+                "Event",
+                filters={"custom_outlook_event_id": ["in", [e["id"] for _, e in events]]},
+                fields=["name", "custom_outlook_event_id"]
+            )
         }
         
+        for resource_url, event_data in events:
+            event_name = event_names.get(event_data["id"])
+            if not event_name:
+                # Outlook-only event: remember it so later notifications skip the Graph fetch
+                frappe.cache().set_value(
+                    _untracked_resource_key(resource_url),
+                    event_data["id"],
+                    expires_in_sec=UNTRACKED_RESOURCE_SECONDS
+                )
+                continue
+
+            # Another worker is writing this event. What we fetched may be newer than what it
+            # applies, so refetch the resource once the lock has cleared rather than drop it.
+            lock_key = f"teams_rsvp_lock:{event_name}"
+            if not acquire_cache_lock(lock_key, 10):
+                if not _schedule_rsvp_retry([resource_url], attempt, RSVP_LOCK_RETRY_SECONDS):
+                    frappe.log_error(message=resource_url, title="RSVP Sync Lock Busy")
+                continue
+
+            try:
+                _apply_rsvp_update(event_name, event_data["attendees"])
+            finally:
+                release_cache_lock(lock_key)
+
+    except (requests.exceptions.Timeout, requests.exceptions.ConnectionError):
+        # Try the chunk again later instead of blocking on a slow Graph endpoint; the
+        # adapter reports connect failures it gave up on as ConnectionError
+        if not _schedule_rsvp_retry(resource_urls, attempt):
+            frappe.log_error(message="\n".join(resource_urls), title="RSVP Sync Timeout")
+    except Exception as e:
+        frappe.log_error(message=str(e), title="RSVP Processing Error")
+
+
+def _schedule_rsvp_retry(resource_urls, attempt, delay=None):
+    """Park resources in Redis for enqueue_due_rsvp_retries rather than sleeping in the worker.
+    Returns False once the retry budget is spent."""
+    if attempt >= RSVP_TIMEOUT_RETRIES:
+        return False
+
+    if delay is None:
+        delay = RSVP_RETRY_BACKOFF_SECONDS * 2 ** attempt
+    cache = frappe.cache()
+    cache.zadd(
+        cache.make_key(RSVP_RETRY_QUEUE_KEY),
+        {orjson.dumps([url, attempt + 1]).decode(): time.time() + delay for url in resource_urls}
+    )
+    return True
+
+
+def enqueue_due_rsvp_retries():
+    """Scheduler job (every minute): hands parked RSVP retries whose backoff has passed back to the short queue."""
+    cache = frappe.cache()
+    key = cache.make_key(RSVP_RETRY_QUEUE_KEY)
+    now = time.time()
+
+    # Read and remove in one MULTI so an entry is never enqueued twice
+    pipe = cache.pipeline()
+    pipe.zrangebyscore(key, 0, now)
+    pipe.zremrangebyscore(key, 0, now)
+    due, _ = pipe.execute()
+
+    by_attempt = {}
+    for member in due:
+        resource_url, attempt = orjson.loads(member)
+        by_attempt.setdefault(attempt, []).append(resource_url)
+
+    for attempt, resource_urls in by_attempt.items():
+        frappe.enqueue(
+            "erpnext_teams_integration.api.auth.process_rsvp_batch",
+            resource_urls=resource_urls,
+            attempt=attempt,
+            queue="short"
+        )
+
+
+def _apply_rsvp_update(event_name, attendees):
+    """Updates the Frappe Event Participants table from a Graph attendee list."""
+    try:
         attendee_responses = {}
         for a in attendees:
             email = a.get("emailAddress", {}).get("address", "").lower()
             status = a.get("status", {}).get("response", "").lower()
             
-            if email and status in status_map:
-                attendee_responses[email] = status_map[status]
+            if email and status in RSVP_STATUS_MAP:
+                attendee_responses[email] = RSVP_STATUS_MAP[status]
                 
-        doc = frappe.get_doc("Event", event_name)
-        doc_updated = False
-        
-        for row in doc.event_participants:
-            row_email = (row.email or "").lower()
-            if row_email in attendee_responses:
-                new_status = attendee_responses[row_email]
-                if row.attending != new_status:
-                    row.attending = new_status
-                    doc_updated = True
+        # Only the child rows change, so skip the full Event load/validate/save cycle
+        participants = frappe.db.get_all(
+            "Event Participants",
+            filters={"parent": event_name, "parenttype": "Event", "email": ["is", "set"]},
+            fields=["name", "email", "attending"]
+        )
+        rows_by_email = {row.email.lower(): row for row in participants}
+        changed = {}
+
+        for email, new_status in attendee_responses.items():
+            row = rows_by_email.get(email)
+            if row and row.attending != new_status:
+                changed[row.name] = new_status
                     
-        if doc_updated:
-            doc.flags.ignore_validate = True 
-            doc.flags.ignore_permissions = True
-            doc.save()
+        if changed:
+            # One UPDATE for every changed row of the event
+            case_sql = " ".join(["WHEN %s THEN %s"] * len(changed))
+            in_sql = ", ".join(["%s"] * len(changed))
+            values = [v for pair in changed.items() for v in pair] + list(changed)
+            frappe.db.sql(
+                f"UPDATE `tabEvent Participants` SET attending = CASE name {case_sql} END WHERE name IN ({in_sql})",
+                values
+            )
+            # Commit while the caller still holds teams_rsvp_lock, and so the row locks
+            # aren't held across the next chunk's $batch call
             frappe.db.commit()
             
     except Exception as e:
@@ -334,40 +670,53 @@ def renew_graph_subscriptions():
     Runs daily.
     """
     try:
-        frappe.msgprint("Renewing Microsoft Graph Subscriptions...")
+        settings = get_settings()
+        sub_id = settings.get("custom_webhook_subscription_id")
+        sub_expiry = settings.get("custom_webhook_subscription_expiry")
+
+        # Enough left that the next daily run (even one a little late) still renews it in time
+        if sub_id and sub_expiry and get_datetime(sub_expiry) - now_datetime() > SUBSCRIPTION_RENEW_BEFORE:
+            return
+
         token = get_access_token()
         if not token: 
             return
-            
-        settings = frappe.get_single("Teams Settings")
-        sub_id = settings.get("custom_webhook_subscription_id")
-        
-        headers = {
-            "Authorization": f"Bearer {token}", 
-            "Content-Type": "application/json"
-        }
         
         if sub_id:
-            expiration_time = datetime.utcnow() + timedelta(days=2)
+            headers = {
+                "Authorization": f"Bearer {token}", 
+                "Content-Type": "application/json"
+            }
+            expiration_time = datetime.utcnow() + SUBSCRIPTION_LIFETIME
+            local_expiry = now_datetime() + SUBSCRIPTION_LIFETIME
             payload = {
                 "expirationDateTime": expiration_time.strftime("%Y-%m-%dT%H:%M:%SZ")
             }
             
-            res = requests.patch(f"{GRAPH_API}/subscriptions/{sub_id}", headers=headers, json=payload)
+            res = request_with_retry_after(
+                "PATCH", f"{GRAPH_API}/subscriptions/{sub_id}", headers=headers, data=orjson.dumps(payload),
+                timeout=(3, 7)
+            )
             
             if res.status_code == 200:
+                settings.db_set("custom_webhook_subscription_expiry", local_expiry, update_modified=False)
+                frappe.db.commit()
+                return
+
+            # Anything but 404 (subscription expired/removed) may leave the subscription alive,
+            # so don't recreate a duplicate; the next daily run tries again
+            if res.status_code != 404:
+                frappe.log_error(message=f"{res.status_code}: {res.text}", title="Webhook Renewal Error")
                 return
-            else:
-                frappe.log_error(message=res.text, title="Webhook Renewal Warning")
-        
-        # Recreate if it failed or didn't exist
-        result = subscribe_to_calendar_events()
         
-        if result and result.get("success"):
-            settings.db_set("custom_webhook_subscription_id", result.get("subscription_id"))
-            frappe.db.commit()
+        # Recreate if it expired or didn't exist, reusing the token loaded above;
+        # the new subscription ID is stored by _create_calendar_subscription itself
+        _create_calendar_subscription(token)
             
+    except (requests.exceptions.HTTPError, requests.exceptions.Timeout, frappe.ValidationError) as e:
+        # Expected Graph failures (subscription errors are already logged with the response body)
+        frappe.log_error(message=str(e)[:1000], title="Webhook Renewal Error")
     except Exception as e:
         error_details = str(e)
         safe_title = f"Webhook Renewal Error: {error_details}"[:135]
-        frappe.log_error(message=frappe.get_traceback(), title=safe_title)
\ No newline at end of file
+        frappe.log_error(message=frappe.get_traceback(), title=safe_title)
@@ -1,10 +1,92 @@
 import frappe
+import orjson
 import requests
+import time
 import urllib.parse
 from datetime import timedelta
-from frappe.utils import now_datetime, get_datetime
+from frappe.utils import now_datetime, get_datetime, cint
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 GRAPH_API = "https://graph.microsoft.com/v1.0"
+GRAPH_BATCH_LIMIT = 20  # Maximum sub-requests Graph accepts per $batch call
+GRAPH_FILTER_CLAUSE_LIMIT = 15  # Maximum child clauses Azure AD accepts in one $filter
+# Each address is matched against both mail and userPrincipalName, i.e. two clauses
+USERS_PER_FILTER = GRAPH_FILTER_CLAUSE_LIMIT // 2
+
+GRAPH_MAX_BACKOFF = 8  # Seconds; cap on the adapter's exponential backoff
+GRAPH_MAX_RETRY_AFTER = 10  # Seconds; cap on a Retry-After the adapter will honour
+
+
+class GraphRetry(Retry):
+    """Retry with both the exponential backoff and Graph's Retry-After capped"""
+    # urllib3 1.x reads the backoff cap from the class
+    DEFAULT_BACKOFF_MAX = BACKOFF_MAX = GRAPH_MAX_BACKOFF
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        if retry_after is None:
+            return None
+        return min(retry_after, GRAPH_MAX_RETRY_AFTER)
+
+
+def _build_retry():
+    retry_kwargs = dict(
+        total=3,
+        # Read timeouts are never replayed: the server may already have acted, and the
+        # caller then still sees requests' Timeout rather than a wrapped ConnectionError
+        read=False,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        # Only idempotent methods; POST/PATCH could create duplicate meetings/subscriptions
+        # or reuse a single-use OAuth code
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS", "DELETE"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        return GraphRetry(backoff_max=GRAPH_MAX_BACKOFF, **retry_kwargs)
+    except TypeError:
+        # urllib3 1.x has no backoff_max argument
+        return GraphRetry(**retry_kwargs)
+
+
+# Shared HTTP session so Graph / login.microsoftonline.com calls reuse pooled
+# keep-alive connections instead of paying a TCP+TLS handshake per request.
+# Idempotent requests are retried on throttling (429 + Retry-After) and transient
+# 5xx with capped exponential backoff; the final response is returned so callers
+# can still inspect the status code.
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=_build_retry()
+))
+
+ACCESS_TOKEN_CACHE_KEY = "teams_access_token"
+AUTH_STATUS_CACHE_KEY = "teams_auth_status"
+TOKEN_EXPIRY_CACHE_KEY = "teams_token_expiry"
+TOKEN_REFRESH_LOCK_KEY = "teams_token_refresh_lock"
+TOKEN_REFRESH_LOCK_SECONDS = 30
+USER_EMAIL_CACHE_KEY = "teams_user_email"
+AZURE_ID_CACHE_KEY = "teams_azure_id"
+
+
+def request_with_retry_after(method, url, max_wait=GRAPH_MAX_RETRY_AFTER, **kwargs):
+    """Send a request through SESSION, waiting out one more Retry-After if Graph is still throttling.
+    A 429 means the request was not processed, so this is safe for POST/PATCH as well."""
+    res = SESSION.request(method, url, **kwargs)
+
+    if res.status_code == 429:
+        time.sleep(min(retry_after_seconds(res.headers), max_wait))
+        res = SESSION.request(method, url, **kwargs)
+
+    return res
+
+
+def retry_after_seconds(headers, default=5):
+    """Seconds from a Retry-After header; it may also be an HTTP date, so fall back to a short fixed wait"""
+    return cint((headers or {}).get("Retry-After")) or default
 
 
 def get_settings():
@@ -19,10 +101,65 @@ def get_settings():
         frappe.throw("Failed to load Teams settings")
 
 
+def cache_access_token(access_token, token_expiry):
+    """Cache the access token in Redis until it is due for a refresh"""
+    if not access_token or not token_expiry:
+        return
+
+    cache_token_expiry(token_expiry)
+
+    # Expire the cached copy at the same point get_access_token would refresh it
+    ttl = int((get_datetime(token_expiry) - now_datetime()).total_seconds()) - 300
+    if ttl > 0:
+        frappe.cache().set_value(ACCESS_TOKEN_CACHE_KEY, access_token, expires_in_sec=ttl)
+
+
+def cache_token_expiry(token_expiry):
+    """Cache token_expiry as epoch seconds so expiry checks skip the Teams Settings read"""
+    if not token_expiry:
+        return
+
+    # token_expiry is naive site-local time, so derive the epoch from the remaining lifetime
+    ttl = int((get_datetime(token_expiry) - now_datetime()).total_seconds())
+    if ttl > 0:
+        frappe.cache().set_value(TOKEN_EXPIRY_CACHE_KEY, int(time.time()) + ttl, expires_in_sec=ttl)
+
+
+def clear_access_token_cache():
+    """Drop the cached access token (and auth status) so the next caller re-reads Teams Settings"""
+    frappe.cache().delete_value([ACCESS_TOKEN_CACHE_KEY, AUTH_STATUS_CACHE_KEY, TOKEN_EXPIRY_CACHE_KEY])
+
+
+def acquire_cache_lock(key, expires_in_sec):
+    """Atomically claim a Redis key for a short window; returns False if it is already held"""
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(key), 1, nx=True, ex=expires_in_sec))
+
+
+def acquire_cache_locks(keys, expires_in_sec):
+    """acquire_cache_lock for several keys in one pipelined Redis round-trip; returns a bool per key"""
+    cache = frappe.cache()
+    pipe = cache.pipeline(transaction=False)
+    for key in keys:
+        pipe.set(cache.make_key(key), 1, nx=True, ex=expires_in_sec)
+    return [bool(claimed) for claimed in pipe.execute()]
+
+
+def release_cache_lock(key):
+    """Release a key claimed with acquire_cache_lock"""
+    cache = frappe.cache()
+    cache.delete(cache.make_key(key))
+
+
 @frappe.whitelist()
 def get_access_token():
     """Get valid access token, refresh if needed"""
     try:
+        # Serve from cache to avoid loading Teams Settings on every Graph call
+        cached_token = frappe.cache().get_value(ACCESS_TOKEN_CACHE_KEY)
+        if cached_token:
+            return cached_token
+
         settings = get_settings()
         
         # Check if we have a token
@@ -42,6 +179,8 @@ def get_access_token():
                 except Exception as e:
                     frappe.log_error(f"Token refresh failed: {str(e)}", "Teams Token Refresh Error")
                     return None
+
+            cache_access_token(settings.access_token, settings.token_expiry)
         
         return settings.access_token
         
@@ -59,58 +198,14 @@ def refresh_access_token():
         if not settings.refresh_token:
             frappe.throw("No refresh token available. Please re-authenticate.")
         
-        # Prepare refresh request
-        token_url = f"https://login.microsoftonline.com/{settings.tenant_id}/oauth2/v2.0/token"
-        data = {
-            "client_id": settings.client_id,
-            "client_secret": settings.client_secret,
-            "grant_type": "refresh_token",
-            "refresh_token": settings.refresh_token,
-            "scope": "https://graph.microsoft.com/.default"
-        }
-        
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        
-        response = requests.post(token_url, data=data, headers=headers, timeout=30)
-        
-        if response.status_code != 200:
-            error_data = response.text
-            try:
-                error_json = response.json()
-                error_data = error_json.get('error_description', error_data)
-            except:
-                pass
-            
-            frappe.log_error(f"Token refresh failed: {response.status_code} - {error_data}", "Teams Token Refresh Error")
-            
-            # If refresh token is invalid, clear all tokens
-            if response.status_code == 400:
-                settings.access_token = ""
-                settings.refresh_token = ""
-                settings.token_expiry = None
-                settings.save(ignore_permissions=True)
-                frappe.db.commit()
-            
-            frappe.throw("Failed to refresh access token. Please re-authenticate.")
-        
-        token_data = response.json()
-        
-        # Update tokens
-        settings.access_token = token_data.get("access_token")
-        
-        # Update refresh token if provided (some OAuth flows provide new refresh token)
-        if token_data.get("refresh_token"):
-            settings.refresh_token = token_data.get("refresh_token")
-        
-        # Calculate new expiry (subtract 5 minutes for safety buffer)
-        expires_in = token_data.get("expires_in", 3600)
-        settings.token_expiry = now_datetime() + timedelta(seconds=expires_in - 300)
-        
-        settings.save(ignore_permissions=True)
-        frappe.db.commit()
-        frappe.clear_cache(doctype="Teams Settings")
+        # Only one worker refreshes at a time; the others wait for its token
+        if not acquire_cache_lock(TOKEN_REFRESH_LOCK_KEY, TOKEN_REFRESH_LOCK_SECONDS):
+            return _wait_for_refreshed_token(settings)
         
-        return settings.access_token
+        try:
+            return _exchange_refresh_token(settings)
+        finally:
+            release_cache_lock(TOKEN_REFRESH_LOCK_KEY)
         
     except requests.exceptions.Timeout:
         frappe.log_error("Token refresh request timed out", "Teams Token Refresh Timeout")
@@ -123,12 +218,242 @@ def refresh_access_token():
         frappe.throw("An unexpected error occurred during authentication.")
 
 
+def _wait_for_refreshed_token(settings):
+    """Token for a worker that lost the refresh race: the current one while it is still valid, else the
+    one the winner caches, polled until its lock clears. None rather than a token known to be stale."""
+    if settings.token_expiry and get_datetime(settings.token_expiry) > now_datetime() + timedelta(seconds=30):
+        return settings.access_token
+
+    cache = frappe.cache()
+    deadline = time.monotonic() + TOKEN_REFRESH_LOCK_SECONDS
+    while time.monotonic() < deadline:
+        time.sleep(0.5)
+        token = _read_cached_access_token()
+        if token or not cache.exists(cache.make_key(TOKEN_REFRESH_LOCK_KEY)):
+            return token or _read_cached_access_token()
+    return None
+
+
+def _read_cached_access_token():
+    cache = frappe.cache()
+    # get_value keeps a per-request copy, which would keep answering with the first miss
+    getattr(frappe.local, "cache", {}).pop(cache.make_key(ACCESS_TOKEN_CACHE_KEY), None)
+    return cache.get_value(ACCESS_TOKEN_CACHE_KEY)
+
+
+def _exchange_refresh_token(settings):
+    """POST the refresh_token grant and store the new tokens"""
+    # Prepare refresh request
+    token_url = f"https://login.microsoftonline.com/{settings.tenant_id}/oauth2/v2.0/token"
+    data = {
+        "client_id": settings.client_id,
+        "client_secret": settings.client_secret,
+        "grant_type": "refresh_token",
+        "refresh_token": settings.refresh_token,
+        "scope": "https://graph.microsoft.com/.default"
+    }
+
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+
+    response = SESSION.post(token_url, data=data, headers=headers, timeout=30)
+
+    if response.status_code != 200:
+        error_data = response.text
+        try:
+            error_json = orjson.loads(response.content)
+            error_data = error_json.get('error_description', error_data)
+        except:
+            pass
+
+        frappe.log_error(f"Token refresh failed: {response.status_code} - {error_data}", "Teams Token Refresh Error")
+
+        # If refresh token is invalid, clear all tokens
+        if response.status_code == 400:
+            frappe.db.set_value("Teams Settings", "Teams Settings", {
+                "access_token": "",
+                "refresh_token": "",
+                "token_expiry": None
+            })
+            frappe.db.commit()
+            frappe.clear_cache(doctype="Teams Settings")
+            clear_access_token_cache()
+
+        frappe.throw("Failed to refresh access token. Please re-authenticate.")
+
+    token_data = orjson.loads(response.content)
+
+    # Update tokens
+    settings.access_token = token_data.get("access_token")
+
+    # Update refresh token if provided (some OAuth flows provide new refresh token)
+    if token_data.get("refresh_token"):
+        settings.refresh_token = token_data.get("refresh_token")
+
+    # Calculate new expiry (subtract 5 minutes for safety buffer)
+    expires_in = token_data.get("expires_in", 3600)
+    settings.token_expiry = now_datetime() + timedelta(seconds=expires_in - 300)
+
+    # Write only the token fields instead of a full Teams Settings save
+    frappe.db.set_value("Teams Settings", "Teams Settings", {
+        "access_token": settings.access_token,
+        "refresh_token": settings.refresh_token,
+        "token_expiry": settings.token_expiry
+    })
+    frappe.db.commit()
+    frappe.clear_cache(doctype="Teams Settings")
+    cache_access_token(settings.access_token, settings.token_expiry)
+
+    return settings.access_token
+
+
+# (site, doctype, column) triples known to exist; only hits are kept so a column
+# added by a later migrate is still picked up without a worker restart
+_KNOWN_COLUMNS = set()
+
+
+def has_column(doctype, column):
+    """frappe.db.has_column, remembered per process once the column is found.
+    Nothing clears this across processes, so restart web and worker processes
+    (bench restart) after a migrate that removes one of these custom fields."""
+    key = (frappe.local.site, doctype, column)
+    if key in _KNOWN_COLUMNS:
+        return True
+    if frappe.db.has_column(doctype, column):
+        _KNOWN_COLUMNS.add(key)
+        return True
+    return False
+
+
+def get_user_emails(users):
+    """Emails of several Users keyed by name; cached entries first, then one query for the rest"""
+    cache = frappe.cache()
+    emails = {user: cache.hget(USER_EMAIL_CACHE_KEY, user) for user in set(users)}
+    missing = [user for user, email in emails.items() if email is None]
+    if missing:
+        found = dict(frappe.db.get_all(
+            "User", filters={"name": ["in", missing]}, fields=["name", "email"], as_list=True
+        ))
+        for user in missing:
+            emails[user] = found.get(user) or ""
+            cache.hset(USER_EMAIL_CACHE_KEY, user, emails[user])
+    return emails
+
+
+def clear_user_lookup_cache(doc=None, method=None):
+    """User doc event: drop cached email and Azure ID lookups"""
+    frappe.cache().delete_value([USER_EMAIL_CACHE_KEY, AZURE_ID_CACHE_KEY])
+
+
 @frappe.whitelist()
 def get_azure_user_id_by_email(email):
     """Get Azure user ID by email address with caching"""
     if not email:
         return None
     
+    # Only hits are cached; a user may still be added to Azure AD later
+    cache_key = email.lower()
+    azure_id = frappe.cache().hget(AZURE_ID_CACHE_KEY, cache_key)
+    if not azure_id:
+        azure_id = _lookup_azure_user_id(email)
+        if azure_id:
+            frappe.cache().hset(AZURE_ID_CACHE_KEY, cache_key, azure_id)
+    return azure_id
+
+
+def get_azure_user_ids_by_email(emails):
+    """Azure user IDs for several emails keyed by lowercased email; cache first, then batched Graph lookups"""
+    cache = frappe.cache()
+    azure_ids = {}
+    pending = []
+    for email in {email.lower() for email in emails if email}:
+        azure_id = cache.hget(AZURE_ID_CACHE_KEY, email)
+        if azure_id:
+            azure_ids[email] = azure_id
+        else:
+            pending.append(email)
+
+    if not pending:
+        return azure_ids
+
+    token = get_access_token()
+    if not token:
+        frappe.log_error(f"No access token available to fetch Azure IDs for {len(pending)} users", "Teams API Error")
+        return azure_ids
+
+    wanted = set(pending)
+    # Each sub-request matches up to USERS_PER_FILTER addresses against mail or userPrincipalName
+    filters = [pending[i:i + USERS_PER_FILTER] for i in range(0, len(pending), USERS_PER_FILTER)]
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    users, throttled, wait, failed = _fetch_users_by_mail(filters, headers)
+    if throttled:
+        # Graph throttles per sub-request inside a 200 $batch; wait out the longest Retry-After once
+        time.sleep(min(wait, GRAPH_MAX_RETRY_AFTER))
+        retry_users, throttled, _, retry_failed = _fetch_users_by_mail(throttled, headers)
+        users += retry_users
+        failed += retry_failed + [f"still throttled: {', '.join(chunk)}" for chunk in throttled]
+
+    for user in users:
+        if not user.get("id"):
+            continue
+        # The address may be the user's mail, their sign-in name, or both
+        for email in {(user.get("mail") or "").lower(), (user.get("userPrincipalName") or "").lower()}:
+            if email in azure_ids or email not in wanted:
+                continue
+            azure_ids[email] = user["id"]
+            cache.hset(AZURE_ID_CACHE_KEY, email, user["id"])
+            # Write through so the next lookup is answered from the User table
+            frappe.db.set_value("User", {"email": email}, "azure_object_id", user["id"], update_modified=False)
+
+    if failed:
+        frappe.log_error("Azure ID lookup sub-requests failed:\n" + "\n".join(failed), "Teams API Error")
+
+    return azure_ids
+
+
+def _fetch_users_by_mail(filters, headers):
+    """Run address filters through $batch; returns (users, throttled filters, longest Retry-After, failures)"""
+    users, throttled, failed = [], [], []
+    wait = 0
+    for start in range(0, len(filters), GRAPH_BATCH_LIMIT):
+        batch = filters[start:start + GRAPH_BATCH_LIMIT]
+        payload = {
+            "requests": [
+                {"id": str(i), "method": "GET", "url": _users_by_mail_url(chunk)}
+                for i, chunk in enumerate(batch)
+            ]
+        }
+        try:
+            # $batch is a POST, which the adapter never retries, so wait out one throttled answer here
+            response = request_with_retry_after(
+                "POST", f"{GRAPH_API}/$batch", headers=headers, data=orjson.dumps(payload), timeout=(3, 10)
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            frappe.log_error(f"Batch Azure ID lookup failed: {e}", "Teams API Error")
+            continue
+
+        for sub in orjson.loads(response.content).get("responses", []):
+            status = cint(sub.get("status"))
+            if status == 429 or status >= 500:
+                throttled.append(batch[int(sub["id"])])
+                wait = max(wait, retry_after_seconds(sub.get("headers")))
+            elif status != 200:
+                failed.append(f"{status}: {sub.get('body')}")
+            else:
+                users.extend((sub.get("body") or {}).get("value", []))
+
+    return users, throttled, wait, failed
+
+
+def _users_by_mail_url(emails):
+    """Relative /users URL matching any of the given addresses by mail or userPrincipalName"""
+    quoted = ",".join("'{}'".format(email.replace("'", "''")) for email in emails)
+    filter_expr = f"mail in ({quoted}) or userPrincipalName in ({quoted})"
+    return f"/users?$select=id,mail,userPrincipalName&$filter={urllib.parse.quote(filter_expr, safe='')}"
+
+
+def _lookup_azure_user_id(email):
+    """Resolve an Azure user ID from the User table, falling back to Graph"""
     try:
         # First check if we already have the Azure ID in our database
         user_doc = frappe.db.get_value("User", {"email": email}, ["name", "azure_object_id"], as_dict=True)
@@ -147,10 +472,10 @@ def get_azure_user_id_by_email(email):
         encoded_email = urllib.parse.quote(email, safe='')
         url = f"{GRAPH_API}/users/{encoded_email}"
         
-        response = requests.get(url, headers=headers, timeout=10)
+        response = SESSION.get(url, headers=headers, timeout=10)
         
         if response.status_code == 200:
-            azure_id = response.json().get("id")
+            azure_id = orjson.loads(response.content).get("id")
             
             # Cache the Azure ID in our database
             if azure_id and user_doc:
@@ -168,9 +493,9 @@ def get_azure_user_id_by_email(email):
                 token = refresh_access_token()
                 headers["Authorization"] = f"Bearer {token}"
                 
-                response = requests.get(url, headers=headers, timeout=10)
+                response = SESSION.get(url, headers=headers, timeout=10)
                 if response.status_code == 200:
-                    azure_id = response.json().get("id")
+                    azure_id = orjson.loads(response.content).get("id")
                     
                     # Cache the Azure ID
                     if azure_id and user_doc:
@@ -280,10 +605,10 @@ def test_api_connection():
             }
         
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{GRAPH_API}/me", headers=headers, timeout=10)
+        response = SESSION.get(f"{GRAPH_API}/me", headers=headers, timeout=10)
         
         if response.status_code == 200:
-            user_data = response.json()
+            user_data = orjson.loads(response.content)
             return {
                 "success": True,
                 "message": "API connection successful",
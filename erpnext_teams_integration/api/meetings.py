@@ -1,34 +1,58 @@
 # apps/erpnext_teams_integration/erpnext_teams_integration/api/meetings.py
 
+import hashlib
 import json
+from dataclasses import dataclass
 from datetime import datetime, time, timedelta
+from urllib.parse import quote
 import frappe
+import orjson
 import pytz
-import requests
 from frappe.utils import get_datetime, now_datetime
-from .helpers import get_access_token, get_azure_user_id_by_email, get_login_url
+from .helpers import get_access_token, get_azure_user_ids_by_email, get_login_url, get_user_emails, has_column, request_with_retry_after
 
 GRAPH_API = "https://graph.microsoft.com/v1.0"
+ISO_FMT = "%Y-%m-%dT%H:%M:%SZ"
+UTC = pytz.utc
+LOCAL_TZ = pytz.timezone("Asia/Kolkata")  # Zone assumed for naive start/end values
+MEETING_IDS_CACHE_SECONDS = 3600
+SYNCED_ATTENDEES_CACHE_SECONDS = 3600
 
 # ---------------------------------------------------------------------------
 # Supported doctypes configuration
 # ---------------------------------------------------------------------------
 
+@dataclass(frozen=True, slots=True)
+class DoctypeCfg:
+    participants_field: str
+    email_field: str
+    subject_field: str
+    start_field: str
+    end_field: str
+    # Applied when a start/end value has no time part (e.g. a plain date)
+    default_start_hour: int = 9
+    default_start_minute: int = 0
+    default_end_hour: int = 9
+    default_end_minute: int = 0
+
+
 SUPPORTED_DOCTYPES = {
-    "Event": {
-        "participants_field": "event_participants",
-        "email_field": "email",
-        "subject_field": "subject",
-        "start_field": "starts_on",
-        "end_field": "ends_on",
-    },
-    "Project": {
-        "participants_field": "users",
-        "email_field": "email",
-        "subject_field": "project_name",
-        "start_field": "expected_start_date",
-        "end_field": "expected_end_date",
-    },
+    "Event": DoctypeCfg(
+        participants_field="event_participants",
+        email_field="email",
+        subject_field="subject",
+        start_field="starts_on",
+        end_field="ends_on",
+    ),
+    "Project": DoctypeCfg(
+        participants_field="users",
+        email_field="email",
+        subject_field="project_name",
+        start_field="expected_start_date",
+        end_field="expected_end_date",
+        default_end_hour=17,
+        default_end_minute=30,
+    ),
 }
 
 # ---------------------------------------------------------------------------
@@ -52,24 +76,6 @@ def safe_log_error(message: str, title: str = "Teams Integration Error"):
     except Exception:
         pass
 
-def to_utc_isoformat(dt, timezone_str="Asia/Kolkata"):
-    try:
-        if not dt:
-            raise ValueError("no datetime provided")
-        if not isinstance(dt, datetime):
-            dt = get_datetime(dt)
-        try:
-            local_tz = pytz.timezone(timezone_str)
-        except Exception:
-            local_tz = pytz.utc
-        if dt.tzinfo is None:
-            dt = local_tz.localize(dt)
-        utc_dt = dt.astimezone(pytz.utc)
-        return utc_dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-    except Exception as e:
-        safe_log_error(f"to_utc_isoformat failed: {e}\nvalue={dt}")
-        return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
-
 def ensure_datetime_with_time(value, default_hour=9, default_minute=0):
     try:
         if not value:
@@ -106,6 +112,12 @@ def _check_api_response(res, docname=None):
         frappe.throw(msg)
     return None
 
+def _graph_request(method: str, path: str, headers: dict, **kwargs):
+    """Sends a Graph call through the shared session. Transient 429/5xx are retried by the
+    session adapter; a final 429 waits out Retry-After once more before giving up."""
+    kwargs.setdefault("timeout", 30)
+    return request_with_retry_after(method, f"{GRAPH_API}{path}", headers=headers, **kwargs)
+
 # ---------------------------------------------------------------------------
 # Attendee & Email Helpers (Updated for External Users)
 # ---------------------------------------------------------------------------
@@ -117,19 +129,16 @@ def _collect_participant_emails(doc):
         frappe.throw(f"Doctype {doctype} is not supported for Teams meetings.")
 
     cfg = SUPPORTED_DOCTYPES[doctype]
-    participants_field = cfg["participants_field"]
-    email_field = cfg["email_field"]
+    email_field = cfg.email_field
 
     emails = set()
-    rows = getattr(doc, participants_field, []) or []
+    rows = getattr(doc, cfg.participants_field, []) or []
+
+    # 1. Resolve every linked User (Internal) in one pass
+    user_emails = get_user_emails([row.user for row in rows if getattr(row, "user", None)])
 
     for row in rows:
-        email = None
-        
-        # 1. Try to get email from linked User (Internal)
-        user_link = getattr(row, "user", None)
-        if user_link:
-            email = frappe.db.get_value("User", user_link, "email")
+        email = user_emails.get(getattr(row, "user", None))
             
         # 2. Fallback to direct email field (External/Guests/Contacts)
         if not email:
@@ -154,78 +163,191 @@ def _build_event_attendees(emails):
 
 def _build_attendees_from_participants_list(emails):
     """Legacy helper for pure OnlineMeetings (Requires Azure IDs)."""
+    emails = [email for email in emails if email]
+    if not emails:
+        return []
+
+    # Since legacy onlineMeetings strictly needs Azure IDs, read the ones already on User in one query
+    rows = frappe.db.get_all(
+        "User",
+        filters={"email": ["in", emails], "azure_object_id": ["is", "set"]},
+        fields=["email", "azure_object_id"],
+    )
+    azure_by_email = {row.email.lower(): row.azure_object_id for row in rows}
+
+    # Fallback to Graph for the rest, resolved together in $batch calls
+    missing = [email for email in emails if email.lower() not in azure_by_email]
+    if missing:
+        try:
+            azure_by_email.update(get_azure_user_ids_by_email(missing))
+        except Exception:
+            pass
+
     attendees = []
     for email in emails:
-        # Since legacy onlineMeetings strictly needs Azure IDs, we look it up from the email
-        azure_id = frappe.db.get_value("User", {"email": email}, "azure_object_id")
-        if not azure_id:
-            try:
-                # Fallback to Graph API lookup if needed
-                azure_id = get_azure_user_id_by_email(email)
-            except Exception:
-                pass
-                
+        azure_id = azure_by_email.get(email.lower())
         if azure_id:
             attendees.append({"identity": {"user": {"id": azure_id}}})
     return attendees
 
-def _build_default_times_for_doctype(doc, doctype: str):
-    cfg = SUPPORTED_DOCTYPES.get(doctype) or {}
-    start_field = cfg.get("start_field")
-    end_field = cfg.get("end_field")
-
-    start_val = getattr(doc, start_field, None) if start_field else None
-    end_val = getattr(doc, end_field, None) if end_field else None
+def _apply_default_times(cfg: DoctypeCfg, start_val, end_val):
+    return (
+        ensure_datetime_with_time(start_val, cfg.default_start_hour, cfg.default_start_minute),
+        ensure_datetime_with_time(end_val, cfg.default_end_hour, cfg.default_end_minute),
+    )
 
-    if doctype == "Project":
-        start_dt = ensure_datetime_with_time(start_val, 9, 0)
-        end_dt = ensure_datetime_with_time(end_val, 17, 30)
-    else:
-        start_dt = ensure_datetime_with_time(start_val)
-        end_dt = ensure_datetime_with_time(end_val)
+def _times_iso_for_doctype(doc, doctype: str, start_val=None, end_val=None):
+    """UTC ISO (start, end) for a meeting, from explicit values or the doctype's date fields."""
+    cfg = SUPPORTED_DOCTYPES[doctype]
+    explicit = bool(start_val and end_val)
+    if not explicit:
+        start_val = getattr(doc, cfg.start_field, None)
+        end_val = getattr(doc, cfg.end_field, None)
 
+    start_dt, end_dt = _apply_default_times(cfg, start_val, end_val)
     if not start_dt:
+        if explicit:
+            frappe.throw("Invalid meeting start time.")
         start_dt = now_datetime()
     if not end_dt or end_dt <= start_dt:
         end_dt = start_dt + timedelta(hours=1)
-    return start_dt, end_dt
+
+    return _to_utc_iso(start_dt), _to_utc_iso(end_dt)
+
+def _to_utc_iso(dt: datetime) -> str:
+    """Graph's UTC ISO form of a datetime; naive values are taken as LOCAL_TZ."""
+    if dt.tzinfo is UTC:
+        return dt.strftime(ISO_FMT)
+    return (dt if dt.tzinfo else LOCAL_TZ.localize(dt)).astimezone(UTC).strftime(ISO_FMT)
 
 def _resolve_subject(doc, doctype: str, docname: str) -> str:
-    cfg = SUPPORTED_DOCTYPES.get(doctype) or {}
-    subject_field = cfg.get("subject_field")
-    subject = (getattr(doc, subject_field, None) or "").strip() if subject_field else ""
+    cfg = SUPPORTED_DOCTYPES.get(doctype)
+    subject = (getattr(doc, cfg.subject_field, None) or "").strip() if cfg else ""
     return subject or f"{doctype} Meeting: {docname}"
 
-@frappe.whitelist()
-def _extract_meeting_id_from_join_url(join_url: str, token: str) -> str | None:
+def _join_url_filter_value(join_url: str) -> str:
+    """Join URL as an OData string literal body: quotes doubled, then percent-encoded so the
+    URL's own '?', '&' and '%' can't break the query string (batch URLs are also sent as-is)."""
+    return quote(join_url.replace("'", "''"), safe="")
+
+def _extract_meeting_id_from_join_url(join_url: str, headers: dict) -> str | None:
     """Finds an OnlineMeeting ID based on the Join URL (Legacy)."""
     try:
         if not join_url: return None
-        headers = _headers_with_auth(token, json_content=False)
-        search_url = f"{GRAPH_API}/me/onlineMeetings?$filter=JoinWebUrl eq '{join_url}'"
-        res = requests.get(search_url, headers=headers, timeout=30)
+        url_filter = _join_url_filter_value(join_url)
+        res = _graph_request("GET", f"/me/onlineMeetings?$filter=JoinWebUrl eq '{url_filter}'&$select=id", headers)
         
         if res.status_code == 200:
-            meetings = res.json().get("value", [])
+            meetings = orjson.loads(res.content).get("value", [])
             if meetings:
                 return meetings[0].get("id")
         return None
     except Exception:
         return None
 
+def _resolve_meeting_ids_batch(join_url: str, headers: dict):
+    """Looks up the Outlook event and the online meeting for a Join URL in one $batch call.
+    Returns (event_id, meeting_id); either may be None."""
+    if not join_url:
+        return None, None
+    try:
+        url_filter = _join_url_filter_value(join_url)
+        payload = {
+            "requests": [
+                {
+                    "id": "event",
+                    "method": "GET",
+                    "url": f"/me/events?$filter=onlineMeeting/joinUrl eq '{url_filter}'&$select=id&$top=1",
+                },
+                {
+                    "id": "meeting",
+                    "method": "GET",
+                    "url": f"/me/onlineMeetings?$filter=JoinWebUrl eq '{url_filter}'&$select=id",
+                },
+            ]
+        }
+        res = _graph_request("POST", "/$batch", headers, data=orjson.dumps(payload))
+        if res.status_code != 200:
+            return None, None
+
+        ids = {}
+        for sub in orjson.loads(res.content).get("responses", []):
+            if sub.get("status") != 200:
+                continue
+            matches = (sub.get("body") or {}).get("value", [])
+            if matches:
+                ids[sub.get("id")] = matches[0].get("id")
+        return ids.get("event"), ids.get("meeting")
+    except Exception:
+        return None, None
+
+def _meeting_ids_for_doc(doc, join_url: str, headers: dict):
+    """Returns (event_id, meeting_id) for a document, preferring the IDs stored on it.
+    Probed IDs are written back so later calls skip the $filter lookup."""
+    event_id = doc.get("custom_outlook_event_id")
+    meeting_id = doc.get("custom_teams_onlinemeeting_id")
+    if event_id or meeting_id:
+        return event_id, meeting_id
+
+    # Only hits are cached so a transient Graph failure isn't remembered
+    cache_key = _meeting_ids_cache_key(join_url)
+    cached = frappe.cache().get_value(cache_key) if join_url else None
+    if cached:
+        event_id, meeting_id = cached
+    else:
+        event_id, meeting_id = _resolve_meeting_ids_batch(join_url, headers)
+        if event_id or meeting_id:
+            frappe.cache().set_value(cache_key, [event_id, meeting_id], expires_in_sec=MEETING_IDS_CACHE_SECONDS)
+
+    _store_meeting_ids(doc, event_id=event_id, meeting_id=meeting_id)
+    return event_id, meeting_id
+
+def _meeting_ids_cache_key(join_url: str) -> str:
+    return f"teams_meeting_ids:{hashlib.sha1((join_url or '').encode()).hexdigest()}"
+
+def _store_meeting_ids(doc, event_id=None, meeting_id=None):
+    """Writes resolved Graph IDs to whichever ID columns the doctype has."""
+    values = {}
+    if event_id and has_column(doc.doctype, "custom_outlook_event_id"):
+        values["custom_outlook_event_id"] = event_id
+    if meeting_id and has_column(doc.doctype, "custom_teams_onlinemeeting_id"):
+        values["custom_teams_onlinemeeting_id"] = meeting_id
+    if values:
+        doc.db_set(values, update_modified=False)
+
+def _clear_meeting_link(doc):
+    """Forgets the meeting URL and any stored Graph IDs so a new meeting starts clean."""
+    if doc.get("custom_teams_meeting_url"):
+        frappe.cache().delete_value(_meeting_ids_cache_key(doc.custom_teams_meeting_url))
+    if doc.get("custom_outlook_event_id"):
+        frappe.cache().delete_value(_synced_attendees_cache_key(doc.custom_outlook_event_id))
+    values = {"custom_teams_meeting_url": ""}
+    for fieldname in ("custom_outlook_event_id", "custom_teams_onlinemeeting_id"):
+        if doc.get(fieldname):
+            values[fieldname] = ""
+    doc.db_set(values)
+
 # ---------------------------------------------------------------------------
 # API: Create or Update meeting
 # ---------------------------------------------------------------------------
 
 @frappe.whitelist()
 def create_meeting(docname, doctype):
+    """Queues meeting creation; the outcome is pushed to the user via the teams_meeting_done event."""
     if doctype not in SUPPORTED_DOCTYPES:
         frappe.throw(f"Doctype {doctype} is not supported.")
 
+    if not get_access_token():
+        return {"error": "auth_required", "login_url": get_login_url(docname)}
+
+    return _enqueue_meeting_job("create", docname, doctype, "Creating Teams meeting...")
+
+def _create_meeting(docname, doctype):
     try:
         token = get_access_token()
         if not token:
             return {"error": "auth_required", "login_url": get_login_url(docname)}
+        headers = _headers_with_auth(token)
 
         doc = frappe.get_doc(doctype, docname)
         
@@ -234,13 +356,15 @@ def create_meeting(docname, doctype):
         
         existing_meeting_url = doc.get("custom_teams_meeting_url")
         if existing_meeting_url:
+            if not participant_emails:
+                return {"success": True, "message": "No participants to sync."}
             existing_event_id = doc.get("custom_outlook_event_id")
             if existing_event_id:
-                return _update_event_attendees(existing_event_id, participant_emails, token)
+                return _update_event_attendees(existing_event_id, participant_emails, headers)
             else:
-                return _update_existing_meeting(doc, participant_emails, existing_meeting_url, token)
+                return _update_existing_meeting(doc, participant_emails, existing_meeting_url, headers)
                 
-        return _create_new_meeting(doc, doctype, docname, participant_emails, token)
+        return _create_new_meeting(doc, doctype, docname, participant_emails, headers)
 
     except frappe.ValidationError:
         raise
@@ -248,27 +372,22 @@ def create_meeting(docname, doctype):
         safe_log_error(f"Create error: {e}", "Teams Meeting Create Error")
         frappe.throw("Failed to create Teams meeting.")
 
-def _create_new_meeting(doc, doctype, docname, participant_emails, token):
+def _create_new_meeting(doc, doctype, docname, participant_emails, headers):
     """Create a new Outlook Calendar Event with Teams meeting attached."""
     try:
         subject = _resolve_subject(doc, doctype, docname)
-        start_dt, end_dt = _build_default_times_for_doctype(doc, doctype)
+        start_iso, end_iso = _times_iso_for_doctype(doc, doctype)
         
         payload = {
             "subject": subject,
-            "start": {"dateTime": to_utc_isoformat(start_dt), "timeZone": "UTC"},
-            "end": {"dateTime": to_utc_isoformat(end_dt), "timeZone": "UTC"},
+            "start": {"dateTime": start_iso, "timeZone": "UTC"},
+            "end": {"dateTime": end_iso, "timeZone": "UTC"},
             "isOnlineMeeting": True,
             "onlineMeetingProvider": "teamsForBusiness",
             "attendees": _build_event_attendees(participant_emails)
         }
 
-        res = requests.post(
-            f"{GRAPH_API}/me/events",
-            headers=_headers_with_auth(token),
-            json=payload,
-            timeout=30,
-        )
+        res = _graph_request("POST", "/me/events", headers, data=orjson.dumps(payload))
         
         check = _check_api_response(res, docname)
         if check: return check
@@ -277,13 +396,13 @@ def _create_new_meeting(doc, doctype, docname, participant_emails, token):
             safe_log_error(f"Event create failed {res.status_code}: {res.text}", "Event Creation Error")
             frappe.throw(f"Teams API error {res.status_code} - {res.text}")
 
-        data = res.json() or {}
+        data = orjson.loads(res.content) or {}
         join_url = data.get("onlineMeeting", {}).get("joinUrl") or data.get("webLink")
 
         if not join_url:
             frappe.throw("Event created but no Teams link returned.")
 
-        if frappe.db.has_column(doctype, 'custom_outlook_event_id'):
+        if has_column(doctype, 'custom_outlook_event_id'):
             doc.db_set("custom_outlook_event_id", data.get("id"))
 
         doc.db_set("custom_teams_meeting_url", join_url)
@@ -300,12 +419,14 @@ def _create_new_meeting(doc, doctype, docname, participant_emails, token):
         safe_log_error(f"Error creating event: {e}", "Event Creation Error")
         frappe.throw(str(e))
 
-def _update_existing_meeting(doc, participant_emails, meeting_url, token):
+def _update_existing_meeting(doc, participant_emails, meeting_url, headers):
     """Update attendees. Tries Event first, then OnlineMeeting."""
     try:
-        meeting_id = _extract_meeting_id_from_join_url(meeting_url, token)
+        event_id, meeting_id = _meeting_ids_for_doc(doc, meeting_url, headers)
+        if event_id:
+            return _update_event_attendees(event_id, participant_emails, headers)
         if meeting_id:
-            return _update_onlinemeeting_attendees(meeting_id, participant_emails, token)
+            return _update_onlinemeeting_attendees(meeting_id, participant_emails, headers)
 
         return {"error": "not_found", "message": "Could not find meeting on Teams/Outlook."}
         
@@ -313,10 +434,15 @@ def _update_existing_meeting(doc, participant_emails, meeting_url, token):
         safe_log_error(f"Update error: {e}", "Meeting Update Error")
         frappe.throw("Failed to update meeting.")
 
-def _update_event_attendees(event_id, participant_emails, token):
+def _update_event_attendees(event_id, participant_emails, headers):
     """Fetch existing event, merge attendees, and patch."""
-    headers = _headers_with_auth(token)
-    get_res = requests.get(f"{GRAPH_API}/me/events/{event_id}", headers=headers)
+    # Attendees are only ever added, so a known superset on the event means nothing to do
+    cache_key = _synced_attendees_cache_key(event_id)
+    synced = frappe.cache().get_value(cache_key)
+    if synced and set(participant_emails) <= set(synced):
+        return {"success": True, "message": "No new participants to add."}
+
+    get_res = _graph_request("GET", f"/me/events/{event_id}?$select=attendees", headers)
     
     check = _check_api_response(get_res)
     if check: return check
@@ -324,45 +450,43 @@ def _update_event_attendees(event_id, participant_emails, token):
     if get_res.status_code != 200:
         frappe.throw("Failed to fetch existing event.")
 
-    current_data = get_res.json()
-    existing_emails = {a.get('emailAddress', {}).get('address', '').lower() for a in current_data.get('attendees', [])}
-    
-    new_attendees = []
-    # Keep existing
-    new_attendees.extend(current_data.get('attendees', []))
-    
-    # Add new
-    for email in participant_emails:
-        if email and email.lower() not in existing_emails:
-            new_attendees.append({
-                "emailAddress": {"address": email},
-                "type": "required"
-            })
-            
-    if len(new_attendees) == len(current_data.get('attendees', [])):
-         return {"success": True, "message": "No new participants to add."}
+    existing = orjson.loads(get_res.content).get('attendees', [])
+    existing_emails = {
+        a['emailAddress']['address'].lower() for a in existing if a.get('emailAddress', {}).get('address')
+    }
+
+    # participant_emails are already lowercased by _collect_participant_emails
+    new_emails = {email for email in participant_emails if email} - existing_emails
+    if not new_emails:
+        frappe.cache().set_value(cache_key, sorted(existing_emails), expires_in_sec=SYNCED_ATTENDEES_CACHE_SECONDS)
+        return {"success": True, "message": "No new participants to add."}
 
-    patch_res = requests.patch(
-        f"{GRAPH_API}/me/events/{event_id}",
-        headers=headers,
-        json={"attendees": new_attendees}
+    # Keep existing, add new
+    new_attendees = existing + _build_event_attendees(sorted(new_emails))
+
+    patch_res = _graph_request(
+        "PATCH", f"/me/events/{event_id}", headers, data=orjson.dumps({"attendees": new_attendees})
     )
     
     check = _check_api_response(patch_res)
     if check: return check
 
     if patch_res.status_code == 200:
+        frappe.cache().set_value(
+            cache_key, sorted(existing_emails | new_emails), expires_in_sec=SYNCED_ATTENDEES_CACHE_SECONDS
+        )
         return {"success": True, "message": "Outlook Event attendees updated."}
     frappe.throw("Failed to update Outlook Event.")
 
-def _update_onlinemeeting_attendees(meeting_id, participant_emails, token):
+def _synced_attendees_cache_key(event_id: str) -> str:
+    return f"teams_meeting_attendees:{hashlib.sha1(event_id.encode()).hexdigest()}"
+
+def _update_onlinemeeting_attendees(meeting_id, participant_emails, headers):
     """Legacy update for pure online meetings. Maps emails back to Azure IDs."""
-    headers = _headers_with_auth(token)
     attendees = _build_attendees_from_participants_list(participant_emails)
-    patch_res = requests.patch(
-        f"{GRAPH_API}/me/onlineMeetings/{meeting_id}",
-        headers=headers,
-        json={"participants": {"attendees": attendees}}
+    patch_res = _graph_request(
+        "PATCH", f"/me/onlineMeetings/{meeting_id}", headers,
+        data=orjson.dumps({"participants": {"attendees": attendees}}),
     )
     if patch_res.status_code in (200, 204):
         return {"success": True, "message": "Teams Meeting participants updated."}
@@ -381,13 +505,14 @@ def get_meeting_details(docname, doctype):
         
         token = get_access_token()
         if not token: return {"exists": True, "url": url, "message": "Auth required."}
+        headers = _headers_with_auth(token)
 
         # Try Event
-        event_id = doc.get("custom_outlook_event_id")
+        event_id, meeting_id = _meeting_ids_for_doc(doc, url, headers)
         if event_id:
-            res = requests.get(f"{GRAPH_API}/me/events/{event_id}", headers=_headers_with_auth(token))
+            res = _graph_request("GET", f"/me/events/{event_id}?$select=subject,start,end,attendees", headers)
             if res.status_code == 200:
-                d = res.json()
+                d = orjson.loads(res.content)
                 return {
                     "exists": True, 
                     "url": url, 
@@ -401,11 +526,14 @@ def get_meeting_details(docname, doctype):
                 }
 
         # Try OnlineMeeting
-        meeting_id = _extract_meeting_id_from_join_url(url, token)
+        # A stored event ID that no longer answers skipped the probe, so look the meeting up now
+        if not meeting_id and doc.get("custom_outlook_event_id"):
+            meeting_id = _extract_meeting_id_from_join_url(url, headers)
+            _store_meeting_ids(doc, meeting_id=meeting_id)
         if meeting_id:
-             res = requests.get(f"{GRAPH_API}/me/onlineMeetings/{meeting_id}", headers=_headers_with_auth(token))
+             res = _graph_request("GET", f"/me/onlineMeetings/{meeting_id}?$select=subject,startDateTime,endDateTime,participants", headers)
              if res.status_code == 200:
-                d = res.json()
+                d = orjson.loads(res.content)
                 return {
                     "exists": True,
                     "url": url,
@@ -434,37 +562,70 @@ def delete_meeting(docname, doctype):
         url = doc.get("custom_teams_meeting_url")
         if not url: return {"success": True}
         
-        token = get_access_token()
-        if not token: return {"error": "auth_required"}
+        if not get_access_token(): return {"error": "auth_required"}
 
-        # Try Event
+        # Unlink locally right away; the Graph DELETE runs in the background
         event_id = doc.get("custom_outlook_event_id")
-        if event_id:
-            requests.delete(f"{GRAPH_API}/me/events/{event_id}", headers=_headers_with_auth(token))
-            doc.db_set("custom_teams_meeting_url", "")
-            return {"success": True, "message": "Outlook Event deleted."}
-
-        # Try OnlineMeeting
-        meeting_id = _extract_meeting_id_from_join_url(url, token)
-        if meeting_id:
-            requests.delete(f"{GRAPH_API}/me/onlineMeetings/{meeting_id}", headers=_headers_with_auth(token))
-            doc.db_set("custom_teams_meeting_url", "")
-            return {"success": True, "message": "Teams Meeting deleted."}
-
-        # Just clear local URL if not found
-        doc.db_set("custom_teams_meeting_url", "")
-        return {"success": True, "message": "URL cleared (not found on remote)."}
+        meeting_id = doc.get("custom_teams_onlinemeeting_id")
+        _clear_meeting_link(doc)
+        frappe.enqueue(
+            "erpnext_teams_integration.api.meetings.delete_remote_meeting",
+            queue="short",
+            enqueue_after_commit=True,
+            join_url=url,
+            event_id=event_id,
+            meeting_id=meeting_id,
+        )
+        return {"success": True, "message": "Meeting unlinked; removing it from Teams/Outlook."}
 
     except Exception as e:
         safe_log_error(f"Delete error: {e}", "Delete Error")
         return {"success": False, "message": "Error deleting meeting."}
 
+def delete_remote_meeting(join_url=None, event_id=None, meeting_id=None):
+    """Background Graph DELETE for a meeting already unlinked from its document."""
+    token = get_access_token()
+    if not token:
+        safe_log_error(f"No access token to delete Teams meeting {join_url}", "Delete Error")
+        return
+    headers = _headers_with_auth(token)
+
+    if not event_id and not meeting_id:
+        event_id, meeting_id = _resolve_meeting_ids_batch(join_url, headers)
+
+    # Try Event, then OnlineMeeting
+    if event_id:
+        path = f"/me/events/{event_id}"
+    elif meeting_id:
+        path = f"/me/onlineMeetings/{meeting_id}"
+    else:
+        return
+
+    res = _graph_request("DELETE", path, headers)
+    if res.status_code not in (200, 204, 404):
+        safe_log_error(f"Graph delete failed {res.status_code}: {res.text}", "Delete Error")
+
 # ---------------------------------------------------------------------------
 # API: Reschedule
 # ---------------------------------------------------------------------------
 
 @frappe.whitelist()
 def reschedule_meeting(docname, doctype, new_start_time=None, new_end_time=None):
+    """Queues the reschedule; the outcome is pushed to the user via the teams_meeting_done event."""
+    if doctype not in SUPPORTED_DOCTYPES:
+        frappe.throw(f"Doctype {doctype} is not supported.")
+    if not frappe.db.get_value(doctype, docname, "custom_teams_meeting_url"):
+        frappe.throw("No meeting found.")
+
+    if not get_access_token():
+        return {"error": "auth_required", "login_url": get_login_url(docname)}
+
+    return _enqueue_meeting_job(
+        "reschedule", docname, doctype, "Rescheduling Teams meeting...",
+        new_start_time=new_start_time, new_end_time=new_end_time,
+    )
+
+def _reschedule_meeting(docname, doctype, new_start_time=None, new_end_time=None):
     try:
         doc = frappe.get_doc(doctype, docname)
         url = doc.get("custom_teams_meeting_url")
@@ -472,32 +633,19 @@ def reschedule_meeting(docname, doctype, new_start_time=None, new_end_time=None)
         
         token = get_access_token()
         if not token: return {"error": "auth_required", "login_url": get_login_url(docname)}
+        headers = _headers_with_auth(token)
 
         # Times
-        if not new_start_time or not new_end_time:
-            start_dt, end_dt = _build_default_times_for_doctype(doc, doctype)
-        else:
-            if doctype == "Project":
-                start_dt = ensure_datetime_with_time(new_start_time, 9, 0)
-                end_dt = ensure_datetime_with_time(new_end_time, 17, 30)
-            else:
-                start_dt = ensure_datetime_with_time(new_start_time)
-                end_dt = ensure_datetime_with_time(new_end_time)
-        
-        if start_dt >= end_dt:
-             end_dt = start_dt + timedelta(hours=1)
-             
-        start_iso = to_utc_isoformat(start_dt)
-        end_iso = to_utc_isoformat(end_dt)
+        start_iso, end_iso = _times_iso_for_doctype(doc, doctype, new_start_time, new_end_time)
 
         # Try Event (Outlook)
-        event_id = doc.get("custom_outlook_event_id")
+        event_id, meeting_id = _meeting_ids_for_doc(doc, url, headers)
         if event_id:
             payload = {
                 "start": {"dateTime": start_iso, "timeZone": "UTC"},
                 "end": {"dateTime": end_iso, "timeZone": "UTC"}
             }
-            res = requests.patch(f"{GRAPH_API}/me/events/{event_id}", headers=_headers_with_auth(token), json=payload)
+            res = _graph_request("PATCH", f"/me/events/{event_id}", headers, data=orjson.dumps(payload))
             
             check = _check_api_response(res)
             if check: return check
@@ -508,10 +656,9 @@ def reschedule_meeting(docname, doctype, new_start_time=None, new_end_time=None)
                 frappe.throw(f"Outlook update failed: {res.status_code}")
 
         # Try OnlineMeeting (Legacy)
-        meeting_id = _extract_meeting_id_from_join_url(url, token)
         if meeting_id:
             payload = {"startDateTime": start_iso, "endDateTime": end_iso}
-            res = requests.patch(f"{GRAPH_API}/me/onlineMeetings/{meeting_id}", headers=_headers_with_auth(token), json=payload)
+            res = _graph_request("PATCH", f"/me/onlineMeetings/{meeting_id}", headers, data=orjson.dumps(payload))
             if res.status_code in (200, 204):
                 return {"success": True, "message": "Teams Meeting updated."}
         
@@ -523,6 +670,78 @@ def reschedule_meeting(docname, doctype, new_start_time=None, new_end_time=None)
         safe_log_error(f"Reschedule error: {e}", "Reschedule Error")
         frappe.throw("Failed to reschedule.")
 
+# ---------------------------------------------------------------------------
+# Background jobs
+# ---------------------------------------------------------------------------
+
+MEETING_JOBS = {
+    "create": _create_meeting,
+    "reschedule": _reschedule_meeting,
+}
+
+def _enqueue_meeting_job(action, docname, doctype, message, **kwargs):
+    """Runs a meeting action on the short queue so the web worker isn't held by Graph calls."""
+    # One pending job per action and document, so repeated clicks can't create duplicate meetings.
+    # Different arguments (e.g. new reschedule times) make a distinct job, so they aren't dropped.
+    job_id = f"teams_meeting::{action}::{doctype}::{docname}"
+    if kwargs:
+        args_hash = hashlib.sha1(orjson.dumps(kwargs, default=str, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        job_id = f"{job_id}::{args_hash[:12]}"
+    job = frappe.enqueue(
+        "erpnext_teams_integration.api.meetings.run_meeting_job",
+        queue="short",
+        timeout=120,
+        job_id=job_id,
+        deduplicate=True,
+        on_failure=_on_meeting_job_failure,
+        action=action,
+        docname=docname,
+        doctype=doctype,
+        **kwargs,
+    )
+    if not job:
+        message = "This Teams meeting is already being updated."
+    return {"queued": True, "job_id": job_id, "message": message}
+
+def run_meeting_job(action, docname, doctype, **kwargs):
+    """Background entry point; reports the result back to the requesting user."""
+    try:
+        result = MEETING_JOBS[action](docname, doctype, **kwargs) or {}
+    except frappe.ValidationError as e:
+        frappe.db.rollback()
+        result = {"success": False, "message": str(e)}
+    except Exception as e:
+        frappe.db.rollback()
+        safe_log_error(f"Meeting job '{action}' failed: {e}", "Teams Meeting Job Error")
+        result = {"success": False, "message": "Teams meeting update failed."}
+
+    _publish_meeting_done(result, action, doctype, docname, frappe.session.user)
+
+def _publish_meeting_done(result, action, doctype, docname, user):
+    frappe.publish_realtime(
+        "teams_meeting_done",
+        {**result, "action": action, "doctype": doctype, "docname": docname},
+        user=user,
+    )
+
+def _on_meeting_job_failure(job, connection, type, value, traceback):
+    """RQ failure callback for a job killed before it could report back (e.g. on timeout)."""
+    # The worker has already torn down the job's site context
+    job_kwargs = job.kwargs
+    kwargs = job_kwargs.get("kwargs") or {}
+    frappe.init(site=job_kwargs["site"])
+    try:
+        frappe.connect()
+        _publish_meeting_done(
+            {"success": False, "message": "Teams meeting update timed out. Please try again."},
+            kwargs.get("action"),
+            kwargs.get("doctype"),
+            kwargs.get("docname"),
+            job_kwargs.get("user"),
+        )
+    finally:
+        frappe.destroy()
+
 # ---------------------------------------------------------------------------
 # API: Attendees
 # ---------------------------------------------------------------------------
@@ -536,15 +755,16 @@ def get_meeting_attendees(docname, doctype):
         
         token = get_access_token()
         if not token: return {"attendees": [], "message": "Auth required."}
+        headers = _headers_with_auth(token)
 
         attendees = []
         
         # Try Event
-        event_id = doc.get("custom_outlook_event_id")
+        event_id, meeting_id = _meeting_ids_for_doc(doc, url, headers)
         if event_id:
-            res = requests.get(f"{GRAPH_API}/me/events/{event_id}", headers=_headers_with_auth(token))
+            res = _graph_request("GET", f"/me/events/{event_id}?$select=attendees", headers)
             if res.status_code == 200:
-                raw_list = res.json().get("attendees", [])
+                raw_list = orjson.loads(res.content).get("attendees", [])
                 for a in raw_list:
                     attendees.append({
                         "email": a.get("emailAddress", {}).get("address"),
@@ -553,11 +773,14 @@ def get_meeting_attendees(docname, doctype):
                 return {"attendees": attendees, "count": len(attendees), "type": "Outlook Event"}
 
         # Try OnlineMeeting
-        meeting_id = _extract_meeting_id_from_join_url(url, token)
+        # A stored event ID that no longer answers skipped the probe, so look the meeting up now
+        if not meeting_id and doc.get("custom_outlook_event_id"):
+            meeting_id = _extract_meeting_id_from_join_url(url, headers)
+            _store_meeting_ids(doc, meeting_id=meeting_id)
         if meeting_id:
-            res = requests.get(f"{GRAPH_API}/me/onlineMeetings/{meeting_id}", headers=_headers_with_auth(token))
+            res = _graph_request("GET", f"/me/onlineMeetings/{meeting_id}?$select=participants", headers)
             if res.status_code == 200:
-                raw_list = res.json().get("participants", {}).get("attendees", [])
+                raw_list = orjson.loads(res.content).get("participants", {}).get("attendees", [])
                 for a in raw_list:
                     user = a.get("identity", {}).get("user", {})
                     attendees.append({
@@ -0,0 +1,108 @@
+# Copyright (c) 2025, Yanky and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock, patch
+from urllib.parse import unquote
+
+import orjson
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_teams_integration.api import helpers
+
+
+def _directory_response(directory, statuses=None):
+	"""Fake $batch answer: every sub-request returns the directory users its filter names"""
+	statuses = statuses or {}
+
+	def request(method, url, headers=None, data=None, timeout=None):
+		responses = []
+		for sub_request in orjson.loads(data)["requests"]:
+			url_filter = unquote(sub_request["url"]).lower()
+			status = statuses.get(sub_request["id"], 200)
+			if status != 200:
+				responses.append({"id": sub_request["id"], "status": status, "body": {"error": {}}})
+				continue
+			users = [
+				user for user in directory
+				if any(f"'{user.get(field)}'".lower() in url_filter for field in ("mail", "userPrincipalName"))
+			]
+			responses.append({"id": sub_request["id"], "status": 200, "body": {"value": users}})
+		return MagicMock(status_code=200, headers={}, content=orjson.dumps({"responses": responses}))
+
+	return request
+
+
+class TestAzureUserIdLookup(FrappeTestCase):
+	def setUp(self):
+		helpers.clear_user_lookup_cache()
+
+	def tearDown(self):
+		helpers.clear_user_lookup_cache()
+
+	def lookup(self, emails, directory, statuses=None):
+		with patch.object(helpers, "get_access_token", return_value="token"), \
+				patch.object(helpers.SESSION, "request", side_effect=_directory_response(directory, statuses)) as request, \
+				patch("frappe.db.set_value") as set_value, \
+				patch("frappe.log_error") as log_error:
+			azure_ids = helpers.get_azure_user_ids_by_email(emails)
+		return azure_ids, request, set_value, log_error
+
+	def test_lookups_are_chunked_into_filters_and_batches(self):
+		emails = [f"user{i}@example.com" for i in range(281)]
+		directory = [{"id": f"id-{i}", "mail": email} for i, email in enumerate(emails)]
+
+		azure_ids, request, _, _ = self.lookup(emails, directory)
+
+		self.assertEqual(len(azure_ids), 281)
+		# 281 addresses -> 41 filters of up to 7 -> $batch calls of 20, 20 and 1
+		batches = [orjson.loads(call.kwargs["data"])["requests"] for call in request.call_args_list]
+		self.assertEqual([len(batch) for batch in batches], [helpers.GRAPH_BATCH_LIMIT, helpers.GRAPH_BATCH_LIMIT, 1])
+		for sub_request in batches[0]:
+			# Every address is one mail and one userPrincipalName clause
+			clauses = unquote(sub_request["url"]).count("@")
+			self.assertLessEqual(clauses, helpers.GRAPH_FILTER_CLAUSE_LIMIT)
+
+	def test_matches_are_cached_and_written_through(self):
+		directory = [
+			{"id": "id-mail", "mail": "Mail.User@example.com"},
+			{"id": "id-upn", "mail": None, "userPrincipalName": "upn.user@example.com"},
+		]
+
+		azure_ids, _, set_value, _ = self.lookup(
+			["mail.user@example.com", "UPN.User@example.com", "missing@example.com"], directory
+		)
+
+		self.assertEqual(azure_ids, {"mail.user@example.com": "id-mail", "upn.user@example.com": "id-upn"})
+		set_value.assert_any_call(
+			"User", {"email": "mail.user@example.com"}, "azure_object_id", "id-mail", update_modified=False
+		)
+		set_value.assert_any_call(
+			"User", {"email": "upn.user@example.com"}, "azure_object_id", "id-upn", update_modified=False
+		)
+
+		# Second lookup is answered from the cache without calling Graph
+		azure_ids, request, _, _ = self.lookup(["mail.user@example.com"], directory)
+		self.assertEqual(azure_ids, {"mail.user@example.com": "id-mail"})
+		self.assertFalse(request.called)
+
+	def test_failed_sub_requests_are_logged(self):
+		azure_ids, _, _, log_error = self.lookup(["user@example.com"], [], statuses={"0": 400})
+
+		self.assertEqual(azure_ids, {})
+		log_error.assert_called_once()
+
+	def test_throttled_sub_requests_are_retried_after_retry_after(self):
+		directory = [{"id": "id-1", "mail": "user@example.com"}]
+		answers = [
+			{"responses": [{"id": "0", "status": 429, "headers": {"Retry-After": "3"}, "body": {}}]},
+			{"responses": [{"id": "0", "status": 200, "body": {"value": directory}}]},
+		]
+		responses = [MagicMock(status_code=200, headers={}, content=orjson.dumps(a)) for a in answers]
+		with patch.object(helpers, "get_access_token", return_value="token"), \
+				patch.object(helpers.SESSION, "request", side_effect=responses), \
+				patch.object(helpers.time, "sleep") as sleep, \
+				patch("frappe.db.set_value"):
+			azure_ids = helpers.get_azure_user_ids_by_email(["user@example.com"])
+
+		sleep.assert_called_once_with(3)
+		self.assertEqual(azure_ids, {"user@example.com": "id-1"})
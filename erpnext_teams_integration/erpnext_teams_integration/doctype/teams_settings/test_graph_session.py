@@ -0,0 +1,30 @@
+# Copyright (c) 2025, Yanky and Contributors
+# See license.txt
+
+from unittest.mock import MagicMock
+
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_teams_integration.api import auth, helpers
+
+
+class TestGraphSession(FrappeTestCase):
+	def retry(self):
+		return helpers.SESSION.get_adapter(helpers.GRAPH_API).max_retries
+
+	def test_auth_and_helpers_share_one_pooled_session(self):
+		self.assertIs(auth.SESSION, helpers.SESSION)
+		adapter = helpers.SESSION.get_adapter(helpers.GRAPH_API)
+		self.assertEqual((adapter._pool_connections, adapter._pool_maxsize), (10, 50))
+		self.assertIs(helpers.SESSION.get_adapter("https://login.microsoftonline.com/"), adapter)
+
+	def test_only_idempotent_methods_are_retried(self):
+		retry = self.retry()
+		self.assertTrue(retry.is_retry("GET", 503))
+		for method in ("POST", "PATCH"):
+			self.assertFalse(retry.is_retry(method, 503))
+			self.assertFalse(retry.is_retry(method, 429))
+
+	def test_retry_after_is_capped(self):
+		response = MagicMock(headers={"Retry-After": "120"})
+		self.assertEqual(self.retry().get_retry_after(response), helpers.GRAPH_MAX_RETRY_AFTER)
@@ -0,0 +1,76 @@
+# Copyright (c) 2025, Yanky and Contributors
+# See license.txt
+
+from datetime import timedelta
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from erpnext_teams_integration.api import helpers
+
+
+class TestTokenRefreshLock(FrappeTestCase):
+	def setUp(self):
+		helpers.clear_access_token_cache()
+
+	def tearDown(self):
+		helpers.clear_access_token_cache()
+
+	def refresh_as_loser(self, expires_in, on_sleep=None):
+		settings = frappe._dict(
+			refresh_token="refresh", access_token="old", token_expiry=now_datetime() + timedelta(seconds=expires_in)
+		)
+		with patch.object(helpers, "get_settings", return_value=settings), \
+				patch.object(helpers, "acquire_cache_lock", return_value=False), \
+				patch.object(helpers, "_exchange_refresh_token") as exchange, \
+				patch.object(helpers.time, "sleep", side_effect=on_sleep) as sleep:
+			token = helpers.refresh_access_token()
+		self.assertFalse(exchange.called)
+		return token, sleep
+
+	def test_loser_keeps_a_still_valid_token(self):
+		token, sleep = self.refresh_as_loser(expires_in=120)
+
+		self.assertEqual(token, "old")
+		self.assertFalse(sleep.called)
+
+	def test_loser_waits_for_the_winners_token(self):
+		def winner_finishes(_seconds):
+			frappe.cache().set_value(helpers.ACCESS_TOKEN_CACHE_KEY, "new", expires_in_sec=60)
+
+		token, _ = self.refresh_as_loser(expires_in=-60, on_sleep=winner_finishes)
+
+		self.assertEqual(token, "new")
+
+	def test_loser_never_returns_an_expired_token(self):
+		token, _ = self.refresh_as_loser(expires_in=-60)
+
+		self.assertIsNone(token)
+
+
+class TestAccessTokenCache(FrappeTestCase):
+	def setUp(self):
+		helpers.clear_access_token_cache()
+
+	def tearDown(self):
+		helpers.clear_access_token_cache()
+
+	def ttl(self):
+		cache = frappe.cache()
+		return cache.ttl(cache.make_key(helpers.ACCESS_TOKEN_CACHE_KEY))
+
+	def test_token_is_cached_until_the_refresh_window(self):
+		helpers.cache_access_token("token", now_datetime() + timedelta(seconds=3600))
+
+		# Expires when get_access_token would start refreshing: 5 minutes before expiry
+		self.assertTrue(3290 <= self.ttl() <= 3300)
+		with patch.object(helpers, "get_settings") as get_settings:
+			self.assertEqual(helpers.get_access_token(), "token")
+		self.assertFalse(get_settings.called)
+
+	def test_token_inside_the_refresh_window_is_not_cached(self):
+		helpers.cache_access_token("token", now_datetime() + timedelta(seconds=200))
+
+		self.assertIsNone(frappe.cache().get_value(helpers.ACCESS_TOKEN_CACHE_KEY, expires=True))
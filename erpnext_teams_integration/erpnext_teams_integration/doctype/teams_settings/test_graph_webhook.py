@@ -0,0 +1,338 @@
+# Copyright (c) 2025, Yanky and Contributors
+# See license.txt
+
+import time
+from datetime import timedelta
+from unittest.mock import MagicMock, patch
+
+import frappe
+import orjson
+import requests
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import now_datetime
+
+from erpnext_teams_integration.api import auth
+from erpnext_teams_integration.api.helpers import release_cache_lock
+
+RESOURCE = "Users/test-user/Events/AAA"
+OTHER_RESOURCE = "Users/test-user/Events/BBB"
+
+
+def _notification(resource, client_state=auth.GRAPH_CLIENT_STATE):
+	return {"resource": resource, "clientState": client_state}
+
+
+def _batch_response(responses, status_code=200, headers=None):
+	response = MagicMock(status_code=status_code, headers=headers or {})
+	response.content = orjson.dumps({"responses": responses})
+	return response
+
+
+class TestGraphWebhook(FrappeTestCase):
+	def setUp(self):
+		self.release_dedupe_locks()
+
+	def tearDown(self):
+		self.release_dedupe_locks()
+
+	def release_dedupe_locks(self):
+		for resource in (RESOURCE, OTHER_RESOURCE):
+			release_cache_lock(auth._webhook_dedupe_key(resource))
+
+	def post(self, notifications, content_length=1):
+		request = MagicMock(content_length=content_length, args={})
+		request.get_json.return_value = {"value": notifications}
+		with patch("frappe.request", request), patch("frappe.enqueue") as enqueue:
+			response = auth.handle_graph_webhook()
+		return response, enqueue
+
+	def enqueued(self, enqueue):
+		return [url for call in enqueue.call_args_list for url in call.kwargs["resource_urls"]]
+
+	def test_repeated_notifications_are_coalesced(self):
+		with patch.object(auth, "_webhook_over_rate_limit", return_value=False):
+			_, first = self.post([_notification(RESOURCE), _notification(RESOURCE), _notification(OTHER_RESOURCE)])
+			_, second = self.post([_notification(RESOURCE)])
+
+		self.assertEqual(self.enqueued(first), [RESOURCE, OTHER_RESOURCE])
+		self.assertFalse(second.called)
+
+	def test_only_notifications_with_client_state_are_queued(self):
+		with patch.object(auth, "_webhook_over_rate_limit", return_value=False):
+			response, enqueue = self.post([
+				_notification(RESOURCE),
+				_notification(OTHER_RESOURCE, client_state="forged"),
+				{"resource": OTHER_RESOURCE},
+			])
+
+		self.assertEqual(response.status_code, 202)
+		self.assertEqual(self.enqueued(enqueue), [RESOURCE])
+
+	def test_non_ascii_client_state_does_not_abort_delivery(self):
+		with patch.object(auth, "_webhook_over_rate_limit", return_value=False):
+			response, enqueue = self.post([
+				_notification(OTHER_RESOURCE, client_state="Frappé"),
+				_notification(RESOURCE),
+			])
+
+		self.assertEqual(response.status_code, 202)
+		self.assertEqual(self.enqueued(enqueue), [RESOURCE])
+
+	def test_forged_notifications_do_not_count_against_rate_limit(self):
+		with patch.object(auth, "_webhook_over_rate_limit") as over_limit:
+			self.post([_notification(RESOURCE, client_state="forged")])
+
+		self.assertFalse(over_limit.called)
+
+	def test_over_rate_limit_asks_graph_to_retry(self):
+		with patch.object(auth, "_webhook_over_rate_limit", return_value=True):
+			response, enqueue = self.post([_notification(RESOURCE)])
+
+		self.assertEqual(response.status_code, 429)
+		self.assertEqual(response.headers["Retry-After"], str(auth.WEBHOOK_RATE_WINDOW_SECONDS))
+		self.assertFalse(enqueue.called)
+
+		# The throttled delivery must not leave a dedupe lock behind for its redelivery
+		with patch.object(auth, "_webhook_over_rate_limit", return_value=False):
+			_, enqueue = self.post([_notification(RESOURCE)])
+		self.assertEqual(self.enqueued(enqueue), [RESOURCE])
+
+	def test_empty_body_is_acknowledged_without_parsing(self):
+		response, enqueue = self.post([_notification(RESOURCE)], content_length=0)
+
+		self.assertEqual(response.status_code, 202)
+		self.assertFalse(enqueue.called)
+
+	def test_chunked_delivery_without_content_length_is_processed(self):
+		with patch.object(auth, "_webhook_over_rate_limit", return_value=False):
+			response, enqueue = self.post([_notification(RESOURCE)], content_length=None)
+
+		self.assertEqual(response.status_code, 202)
+		self.assertEqual(self.enqueued(enqueue), [RESOURCE])
+
+
+class TestRSVPRetries(FrappeTestCase):
+	def setUp(self):
+		self.clear_retry_queue()
+
+	def tearDown(self):
+		self.clear_retry_queue()
+
+	def clear_retry_queue(self):
+		frappe.cache().delete(frappe.cache().make_key(auth.RSVP_RETRY_QUEUE_KEY))
+
+	def test_connection_error_parks_the_chunk_instead_of_sleeping(self):
+		error = requests.exceptions.ConnectionError()
+		with patch.object(auth.SESSION, "post", side_effect=error), \
+				patch.object(auth.time, "sleep") as sleep, \
+				patch("frappe.enqueue") as enqueue:
+			auth._sync_rsvp_chunk([RESOURCE], {}, attempt=1)
+
+		self.assertFalse(sleep.called)
+		self.assertFalse(enqueue.called)
+
+		# Parked with the doubled backoff; nothing is due yet
+		with patch("frappe.enqueue") as enqueue:
+			auth.enqueue_due_rsvp_retries()
+		self.assertFalse(enqueue.called)
+
+		with patch.object(auth.time, "time", return_value=time.time() + auth.RSVP_RETRY_BACKOFF_SECONDS * 2), \
+				patch("frappe.enqueue") as enqueue:
+			auth.enqueue_due_rsvp_retries()
+		enqueue.assert_called_once()
+		self.assertEqual(enqueue.call_args.kwargs["resource_urls"], [RESOURCE])
+		self.assertEqual(enqueue.call_args.kwargs["attempt"], 2)
+
+	def test_due_retries_are_enqueued_once(self):
+		auth._schedule_rsvp_retry([RESOURCE, OTHER_RESOURCE], 0, delay=0)
+
+		with patch("frappe.enqueue") as enqueue:
+			auth.enqueue_due_rsvp_retries()
+			auth.enqueue_due_rsvp_retries()
+
+		enqueue.assert_called_once()
+		self.assertCountEqual(enqueue.call_args.kwargs["resource_urls"], [RESOURCE, OTHER_RESOURCE])
+
+	def test_throttled_batch_is_parked_until_retry_after(self):
+		response = _batch_response([], status_code=503, headers={"Retry-After": "30"})
+		with patch.object(auth.SESSION, "post", return_value=response), \
+				patch("frappe.log_error") as log_error:
+			auth._sync_rsvp_chunk([RESOURCE], {})
+
+		self.assertFalse(log_error.called)
+		with patch.object(auth.time, "time", return_value=time.time() + 20), patch("frappe.enqueue") as enqueue:
+			auth.enqueue_due_rsvp_retries()
+		self.assertFalse(enqueue.called)
+
+		with patch.object(auth.time, "time", return_value=time.time() + 31), patch("frappe.enqueue") as enqueue:
+			auth.enqueue_due_rsvp_retries()
+		self.assertEqual(enqueue.call_args.kwargs["resource_urls"], [RESOURCE])
+
+	def test_retry_budget_is_bounded(self):
+		self.assertFalse(auth._schedule_rsvp_retry([RESOURCE], auth.RSVP_TIMEOUT_RETRIES))
+
+
+class TestRSVPBatching(FrappeTestCase):
+	def setUp(self):
+		self.clear_markers()
+
+	def tearDown(self):
+		self.clear_markers()
+
+	def clear_markers(self):
+		frappe.cache().delete(frappe.cache().make_key(auth.RSVP_RETRY_QUEUE_KEY))
+		for resource in (RESOURCE, OTHER_RESOURCE):
+			frappe.cache().delete_value(auth._untracked_resource_key(resource))
+
+	def sync_chunk(self, responses, tracked=()):
+		with patch.object(auth.SESSION, "post", return_value=_batch_response(responses)) as post, \
+				patch("frappe.db.get_all", return_value=list(tracked)), \
+				patch.object(auth, "_apply_rsvp_update") as apply_update:
+			auth._sync_rsvp_chunk([RESOURCE, OTHER_RESOURCE], {})
+		return post, apply_update
+
+	def test_resources_are_fetched_in_graph_batch_sized_chunks(self):
+		urls = [f"Users/test-user/Events/{i}" for i in range(45)]
+		with patch.object(auth, "get_access_token", return_value="token"), \
+				patch.object(auth, "_sync_rsvp_chunk") as sync_chunk:
+			auth.process_rsvp_batch(urls + urls[:5])
+
+		chunks = [call.args[0] for call in sync_chunk.call_args_list]
+		self.assertEqual([len(chunk) for chunk in chunks], [20, 20, 5])
+		self.assertEqual([url for chunk in chunks for url in chunk], urls)
+
+	def test_chunk_is_fetched_in_one_batch_call(self):
+		attendees = [{"emailAddress": {"address": "a@example.com"}}]
+		responses = [
+			{"id": "0", "status": 200, "body": {"id": "AAA", "attendees": attendees}},
+			{"id": "1", "status": 404, "body": {"error": {}}},
+		]
+		tracked = [frappe._dict(name="EV-0001", custom_outlook_event_id="AAA")]
+		with patch("frappe.log_error") as log_error:
+			post, apply_update = self.sync_chunk(responses, tracked)
+
+		self.assertEqual(post.call_count, 1)
+		sub_requests = orjson.loads(post.call_args.kwargs["data"])["requests"]
+		self.assertEqual(
+			[r["url"] for r in sub_requests],
+			[f"/{RESOURCE}?$select=id,attendees", f"/{OTHER_RESOURCE}?$select=id,attendees"],
+		)
+		apply_update.assert_called_once_with("EV-0001", attendees)
+		log_error.assert_called_once()
+
+	def test_throttled_sub_responses_are_parked(self):
+		responses = [
+			{"id": "0", "status": 429, "headers": {"Retry-After": "40"}, "body": {}},
+			{"id": "1", "status": 503, "body": {}},
+		]
+		with patch("frappe.log_error") as log_error:
+			self.sync_chunk(responses)
+		self.assertFalse(log_error.called)
+
+		with patch.object(auth.time, "time", return_value=time.time() + 41), patch("frappe.enqueue") as enqueue:
+			auth.enqueue_due_rsvp_retries()
+		self.assertCountEqual(enqueue.call_args.kwargs["resource_urls"], [RESOURCE, OTHER_RESOURCE])
+
+	def test_event_locked_by_another_worker_is_refetched_later(self):
+		responses = [{"id": "0", "status": 200, "body": {"id": "AAA", "attendees": [{"emailAddress": {}}]}}]
+		tracked = [frappe._dict(name="EV-0001", custom_outlook_event_id="AAA")]
+		with patch.object(auth, "acquire_cache_lock", return_value=False):
+			_, apply_update = self.sync_chunk(responses, tracked)
+		self.assertFalse(apply_update.called)
+
+		due = time.time() + auth.RSVP_LOCK_RETRY_SECONDS + 1
+		with patch.object(auth.time, "time", return_value=due), patch("frappe.enqueue") as enqueue:
+			auth.enqueue_due_rsvp_retries()
+		self.assertEqual(enqueue.call_args.kwargs["resource_urls"], [RESOURCE])
+
+	def test_untracked_events_are_remembered(self):
+		responses = [{"id": "1", "status": 200, "body": {"id": "BBB", "attendees": [{"emailAddress": {}}]}}]
+		_, apply_update = self.sync_chunk(responses)
+
+		self.assertFalse(apply_update.called)
+		self.assertEqual(frappe.cache().get_value(auth._untracked_resource_key(OTHER_RESOURCE)), "BBB")
+
+	def test_untracked_resource_is_fetched_again_once_linked(self):
+		frappe.cache().set_value(auth._untracked_resource_key(RESOURCE), "AAA")
+		frappe.cache().set_value(auth._untracked_resource_key(OTHER_RESOURCE), "BBB")
+
+		with patch("frappe.db.get_all", return_value=["AAA"]):
+			urls = auth._drop_untracked_resources([RESOURCE, OTHER_RESOURCE])
+
+		self.assertEqual(urls, [RESOURCE])
+		self.assertIsNone(frappe.cache().get_value(auth._untracked_resource_key(RESOURCE)))
+
+
+class TestRSVPUpdate(FrappeTestCase):
+	def apply(self, attendees, rows):
+		with patch("frappe.db.get_all", return_value=rows), \
+				patch("frappe.db.sql") as sql, \
+				patch("frappe.db.commit"):
+			auth._apply_rsvp_update("EV-0001", attendees)
+		return sql
+
+	def test_changed_rows_are_written_in_one_case_update(self):
+		attendees = [
+			{"emailAddress": {"address": "A@example.com"}, "status": {"response": "accepted"}},
+			{"emailAddress": {"address": "b@example.com"}, "status": {"response": "declined"}},
+			{"emailAddress": {"address": "c@example.com"}, "status": {"response": "tentative"}},
+			{"emailAddress": {"address": "d@example.com"}, "status": {"response": "none"}},
+		]
+		rows = [
+			frappe._dict(name="row-a", email="a@example.com", attending=""),
+			frappe._dict(name="row-b", email="B@example.com", attending="No"),
+			frappe._dict(name="row-c", email="c@example.com", attending="Yes"),
+		]
+
+		sql = self.apply(attendees, rows)
+
+		sql.assert_called_once()
+		query, values = sql.call_args.args
+		self.assertIn("SET attending = CASE name WHEN %s THEN %s WHEN %s THEN %s END", query)
+		self.assertEqual(values, ["row-a", "Yes", "row-c", "Maybe", "row-a", "row-c"])
+
+	def test_unchanged_rows_issue_no_update(self):
+		attendees = [{"emailAddress": {"address": "a@example.com"}, "status": {"response": "accepted"}}]
+		rows = [frappe._dict(name="row-a", email="a@example.com", attending="Yes")]
+
+		self.assertFalse(self.apply(attendees, rows).called)
+
+
+class TestSubscriptionRenewal(FrappeTestCase):
+	def renew(self, hours_left, status_code=200):
+		settings = frappe._dict(
+			custom_webhook_subscription_id="sub-id",
+			custom_webhook_subscription_expiry=now_datetime() + timedelta(hours=hours_left),
+			db_set=MagicMock(),
+		)
+		response = MagicMock(status_code=status_code, text="")
+		with patch.object(auth, "get_settings", return_value=settings), \
+				patch.object(auth, "get_access_token", return_value="token"), \
+				patch.object(auth, "request_with_retry_after", return_value=response) as patch_request, \
+				patch.object(auth, "_create_calendar_subscription") as create, \
+				patch("frappe.db.commit"), \
+				patch("frappe.log_error") as self.log_error:
+			auth.renew_graph_subscriptions()
+		return settings, patch_request, create
+
+	def test_renewal_is_skipped_while_plenty_is_left(self):
+		_, patch_request, _ = self.renew(hours_left=40)
+		self.assertFalse(patch_request.called)
+
+	def test_renewal_extends_to_the_full_lifetime(self):
+		settings, patch_request, create = self.renew(hours_left=30)
+
+		self.assertEqual(patch_request.call_args.args[0], "PATCH")
+		self.assertFalse(create.called)
+		new_expiry = settings.db_set.call_args.args[1]
+		self.assertGreater(new_expiry - now_datetime(), auth.SUBSCRIPTION_RENEW_BEFORE + timedelta(hours=24))
+
+	def test_expired_subscription_is_recreated(self):
+		_, _, create = self.renew(hours_left=-1, status_code=404)
+		create.assert_called_once_with("token")
+
+	def test_failed_renewal_is_logged_once(self):
+		_, _, create = self.renew(hours_left=10, status_code=403)
+
+		self.assertFalse(create.called)
+		self.log_error.assert_called_once()
@@ -0,0 +1,180 @@
+# Copyright (c) 2025, Yanky and Contributors
+# See license.txt
+
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+from urllib.parse import unquote
+
+import frappe
+import pytz
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext_teams_integration.api import meetings
+
+JOIN_URL = "https://teams.microsoft.com/l/meetup-join/19%3ameeting_abc%40thread.v2/0?context=%7b%22Tid%22%7d&x='y'"
+
+
+class TestMeetingJobs(FrappeTestCase):
+	def enqueue(self, action="reschedule", job=True, **kwargs):
+		with patch("frappe.enqueue", return_value=MagicMock() if job else None) as enqueue:
+			result = meetings._enqueue_meeting_job(action, "EV-0001", "Event", "Queued", **kwargs)
+		return result, enqueue
+
+	def test_jobs_are_deduplicated_per_document(self):
+		result, enqueue = self.enqueue("create")
+
+		self.assertEqual(result["job_id"], "teams_meeting::create::Event::EV-0001")
+		self.assertTrue(enqueue.call_args.kwargs["deduplicate"])
+		self.assertEqual(result["message"], "Queued")
+
+		result, _ = self.enqueue("create", job=False)
+		self.assertNotEqual(result["message"], "Queued")
+
+	def test_reschedules_to_different_times_are_distinct_jobs(self):
+		first, _ = self.enqueue(new_start_time="2025-01-06 10:00:00", new_end_time="2025-01-06 11:00:00")
+		again, _ = self.enqueue(new_start_time="2025-01-06 10:00:00", new_end_time="2025-01-06 11:00:00")
+		moved, _ = self.enqueue(new_start_time="2025-01-06 12:00:00", new_end_time="2025-01-06 13:00:00")
+
+		self.assertEqual(first["job_id"], again["job_id"])
+		self.assertNotEqual(first["job_id"], moved["job_id"])
+
+	def run_job(self, side_effect=None, return_value=None):
+		job = MagicMock(side_effect=side_effect, return_value=return_value)
+		with patch.dict(meetings.MEETING_JOBS, {"create": job}), \
+				patch("frappe.publish_realtime") as publish, \
+				patch("frappe.db.rollback") as rollback, \
+				patch.object(meetings, "safe_log_error"):
+			meetings.run_meeting_job("create", "EV-0001", "Event")
+		return publish.call_args, rollback
+
+	def test_job_result_is_published(self):
+		call, rollback = self.run_job(return_value={"success": True, "message": "Created"})
+
+		self.assertEqual(call.args[0], "teams_meeting_done")
+		self.assertEqual(
+			call.args[1],
+			{"success": True, "message": "Created", "action": "create", "doctype": "Event", "docname": "EV-0001"},
+		)
+		self.assertFalse(rollback.called)
+
+	def test_job_failures_are_rolled_back_and_published(self):
+		call, rollback = self.run_job(side_effect=frappe.ValidationError("Bad times"))
+		self.assertEqual(call.args[1]["message"], "Bad times")
+		self.assertTrue(rollback.called)
+
+		call, rollback = self.run_job(side_effect=RuntimeError("boom"))
+		self.assertFalse(call.args[1]["success"])
+		self.assertTrue(rollback.called)
+
+	def test_killed_job_is_reported_from_the_failure_callback(self):
+		job = MagicMock(kwargs={
+			"site": frappe.local.site,
+			"user": "test@example.com",
+			"kwargs": {"action": "reschedule", "doctype": "Event", "docname": "EV-0001"},
+		})
+		with patch("frappe.init") as init, patch("frappe.connect"), patch("frappe.destroy") as destroy, \
+				patch("frappe.publish_realtime") as publish:
+			meetings._on_meeting_job_failure(job, None, None, None, None)
+
+		init.assert_called_once_with(site=frappe.local.site)
+		self.assertTrue(destroy.called)
+		self.assertEqual(publish.call_args.kwargs["user"], "test@example.com")
+		self.assertFalse(publish.call_args.args[1]["success"])
+		self.assertEqual(publish.call_args.args[1]["action"], "reschedule")
+
+
+class TestMeetingTimes(FrappeTestCase):
+	def test_utc_iso_conversion(self):
+		# Naive values are Asia/Kolkata; aware ones keep their own zone
+		self.assertEqual(meetings._to_utc_iso(datetime(2025, 1, 6, 10, 0)), "2025-01-06T04:30:00Z")
+		self.assertEqual(
+			meetings._to_utc_iso(pytz.timezone("Europe/London").localize(datetime(2025, 7, 1, 10, 0))),
+			"2025-07-01T09:00:00Z",
+		)
+		self.assertEqual(meetings._to_utc_iso(pytz.utc.localize(datetime(2025, 1, 6, 10, 0))), "2025-01-06T10:00:00Z")
+
+	def test_date_only_fields_get_doctype_default_hours(self):
+		doc = frappe._dict(expected_start_date="2025-01-06", expected_end_date="2025-01-07")
+
+		# Project defaults are 09:00-17:30 Asia/Kolkata
+		self.assertEqual(
+			meetings._times_iso_for_doctype(doc, "Project"),
+			("2025-01-06T03:30:00Z", "2025-01-07T12:00:00Z"),
+		)
+
+	def test_missing_or_early_end_defaults_to_one_hour(self):
+		doc = frappe._dict(starts_on="2025-01-06 10:00:00", ends_on=None)
+		self.assertEqual(
+			meetings._times_iso_for_doctype(doc, "Event"),
+			("2025-01-06T04:30:00Z", "2025-01-06T05:30:00Z"),
+		)
+
+		doc = frappe._dict(starts_on="2025-01-06 10:00:00", ends_on="2025-01-06 09:00:00")
+		self.assertEqual(
+			meetings._times_iso_for_doctype(doc, "Event"),
+			("2025-01-06T04:30:00Z", "2025-01-06T05:30:00Z"),
+		)
+
+	def test_explicit_values_override_doc_fields(self):
+		doc = frappe._dict(starts_on="2025-01-06 10:00:00", ends_on="2025-01-06 11:00:00")
+		self.assertEqual(
+			meetings._times_iso_for_doctype(doc, "Event", "2025-02-01 15:00:00", "2025-02-01 16:00:00"),
+			("2025-02-01T09:30:00Z", "2025-02-01T10:30:00Z"),
+		)
+
+	def test_invalid_explicit_start_is_rejected(self):
+		with self.assertRaises(frappe.ValidationError):
+			meetings._times_iso_for_doctype(frappe._dict(), "Event", "not a date", "2025-02-01 16:00:00")
+
+
+class TestMeetingIdResolution(FrappeTestCase):
+	def setUp(self):
+		frappe.cache().delete_value(meetings._meeting_ids_cache_key(JOIN_URL))
+
+	def tearDown(self):
+		frappe.cache().delete_value(meetings._meeting_ids_cache_key(JOIN_URL))
+
+	def resolve(self, doc, ids):
+		with patch.object(meetings, "_resolve_meeting_ids_batch", return_value=ids) as probe, \
+				patch.object(meetings, "has_column", return_value=True):
+			result = meetings._meeting_ids_for_doc(doc, JOIN_URL, {})
+		return result, probe
+
+	def new_doc(self, **values):
+		return frappe._dict(doctype="Event", db_set=MagicMock(), **values)
+
+	def test_probed_ids_are_cached_and_written_back(self):
+		doc = self.new_doc()
+		result, probe = self.resolve(doc, ("EVT", "MTG"))
+
+		self.assertEqual(result, ("EVT", "MTG"))
+		self.assertEqual(probe.call_count, 1)
+		doc.db_set.assert_called_once_with(
+			{"custom_outlook_event_id": "EVT", "custom_teams_onlinemeeting_id": "MTG"}, update_modified=False
+		)
+
+		# Another document with the same join URL is answered from the cache
+		doc = self.new_doc()
+		result, probe = self.resolve(doc, ("OTHER", "OTHER"))
+		self.assertEqual(result, ("EVT", "MTG"))
+		self.assertFalse(probe.called)
+		self.assertTrue(doc.db_set.called)
+
+	def test_misses_are_not_cached(self):
+		self.resolve(self.new_doc(), (None, None))
+		_, probe = self.resolve(self.new_doc(), ("EVT", None))
+		self.assertTrue(probe.called)
+
+	def test_stored_ids_skip_the_lookup(self):
+		doc = self.new_doc(custom_outlook_event_id="STORED")
+		result, probe = self.resolve(doc, ("EVT", "MTG"))
+
+		self.assertEqual(result, ("STORED", None))
+		self.assertFalse(probe.called)
+		self.assertFalse(doc.db_set.called)
+
+	def test_join_url_filter_value_is_escaped(self):
+		value = meetings._join_url_filter_value(JOIN_URL)
+		self.assertNotIn("?", value)
+		self.assertNotIn("&", value)
+		self.assertEqual(unquote(value), JOIN_URL.replace("'", "''"))
@@ -91,6 +91,7 @@ doctype_js = {
 # after_install = "erpnext_teams_integration.install.after_install"
 
 after_install = "erpnext_teams_integration.install.after_install"
+after_migrate = "erpnext_teams_integration.install.after_migrate"
 
 # Uninstallation
 # ------------
@@ -152,6 +153,13 @@ after_install = "erpnext_teams_integration.install.after_install"
 # 	}
 # }
 
+doc_events = {
+	"User": {
+		"on_update": "erpnext_teams_integration.api.helpers.clear_user_lookup_cache",
+		"on_trash": "erpnext_teams_integration.api.helpers.clear_user_lookup_cache"
+	}
+}
+
 # Scheduled Tasks
 # ---------------
 
@@ -179,7 +187,12 @@ scheduler_events = {
        ],
        "daily": [
             "erpnext_teams_integration.api.auth.renew_graph_subscriptions"
-    ]
+    ],
+       "cron": {
+           "* * * * *": [
+               "erpnext_teams_integration.api.auth.enqueue_due_rsvp_retries"
+           ]
+       }
 }
 
 # Testing
@@ -21,6 +21,8 @@
 import frappe
 from frappe.custom.doctype.custom_field.custom_field import create_custom_field
 
+from erpnext_teams_integration.patches import add_outlook_event_id_index
+
 
 def after_install():
     """Post-installation setup for ERPNext Teams Integration"""
@@ -53,6 +55,14 @@ def after_install():
         raise
 
 
+def after_migrate():
+    """Post-migration setup that needs the synced fixtures"""
+    # after_install runs before fixtures are synced and marks every patch as already
+    # applied, so fresh sites only get the custom_outlook_event_id column (and index) here.
+    # add_index skips an index that already exists.
+    add_outlook_event_id_index.execute()
+
+
 def create_azure_object_id_field():
     """Create Azure Object ID custom field in User doctype"""
     try:
@@ -295,7 +305,8 @@ def remove_database_indexes():
             "idx_teams_chat_message_id", 
             "idx_teams_chat_message_direction_created",
             "idx_teams_conversation_chat_id",
-            "idx_user_azure_object_id"
+            "idx_user_azure_object_id",
+            "idx_event_outlook_event_id"
         ]
         
         for index_name in indexes_to_remove:
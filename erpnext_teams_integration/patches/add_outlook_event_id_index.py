@@ -0,0 +1,10 @@
+import frappe
+
+
+def execute():
+    """Index Event.custom_outlook_event_id so webhook RSVP lookups avoid a full table scan"""
+    if not frappe.db.has_column("Event", "custom_outlook_event_id"):
+        return
+
+    # Small Text maps to a TEXT column, which MariaDB can only index with a prefix length
+    frappe.db.add_index("Event", ["custom_outlook_event_id(140)"], "idx_event_outlook_event_id")
@@ -52,6 +52,18 @@ frappe.ui.form.on("Event", {
         }
 
         if (!frm.doc.__islocal) {
+            // Meeting create/reschedule run in the background and report back here
+            frappe.realtime.off("teams_meeting_done");
+            frappe.realtime.on("teams_meeting_done", (data) => {
+                if (data.doctype !== frm.doc.doctype || data.docname !== frm.doc.name) return;
+                if (data.login_url) {
+                    window.location.href = data.login_url;
+                    return;
+                }
+                if (data.message) frappe.msgprint(data.message);
+                frm.reload_doc();
+            });
+
             // Create a dropdown called "Teams"
             frm.add_custom_button(__('Create Teams Chat'), () => {
                 frappe.call({
@@ -131,6 +143,10 @@ frappe.ui.form.on("Event", {
                     method: "erpnext_teams_integration.api.meetings.create_meeting",
                     args: { docname: frm.doc.name, doctype: frm.doc.doctype },
                     callback: function(r) {
+                        if (r.message?.queued) {
+                            frappe.show_alert({ message: r.message.message, indicator: "blue" });
+                            return;
+                        }
                         if (r.message) {
                             // If it's an object, show the .message field
                             let msg = (typeof r.message === "string") ? r.message : r.message.message;
@@ -149,6 +165,10 @@ frappe.ui.form.on("Event", {
                     method: "erpnext_teams_integration.api.meetings.reschedule_meeting",
                     args: { docname: frm.doc.name, doctype: frm.doc.doctype },
                     callback: function(r) {
+                        if (r.message?.queued) {
+                            frappe.show_alert({ message: r.message.message, indicator: "blue" });
+                            return;
+                        }
                         if (r.message) {
                             // If it's an object, show the .message field
                             let msg = (typeof r.message === "string") ? r.message : r.message.message;
@@ -55,6 +55,17 @@ frappe.ui.form.on("Project", {
 
         // 3. Document Action Buttons (Only for saved docs)
         if (!frm.doc.__islocal) {
+            // Meeting create/reschedule run in the background and report back here
+            frappe.realtime.off("teams_meeting_done");
+            frappe.realtime.on("teams_meeting_done", (data) => {
+                if (data.doctype !== frm.doc.doctype || data.docname !== frm.doc.name) return;
+                if (data.login_url) {
+                    window.location.href = data.login_url;
+                    return;
+                }
+                if (data.message) frappe.msgprint(data.message);
+                frm.reload_doc();
+            });
             
             // Create Teams Chat
             frm.add_custom_button(__('Create Teams Chat'), () => {
@@ -156,6 +167,10 @@ frappe.ui.form.on("Project", {
                     method: "erpnext_teams_integration.api.meetings.create_meeting",
                     args: { docname: frm.doc.name, doctype: frm.doc.doctype },
                     callback: (r) => {
+                        if (r.message?.queued) {
+                            frappe.show_alert({ message: r.message.message, indicator: "blue" });
+                            return;
+                        }
                         if (r.message) {
                             let msg = typeof r.message === "string" ? r.message : r.message.message;
                             if (msg) frappe.msgprint(msg);
@@ -175,6 +190,10 @@ frappe.ui.form.on("Project", {
                     method: "erpnext_teams_integration.api.meetings.reschedule_meeting",
                     args: { docname: frm.doc.name, doctype: frm.doc.doctype },
                     callback: function(r) {
+                        if (r.message?.queued) {
+                            frappe.show_alert({ message: r.message.message, indicator: "blue" });
+                            return;
+                        }
                         if (r.message) {
                             // If it's an object, show the .message field
                             let msg = (typeof r.message === "string") ? r.message : r.message.message;